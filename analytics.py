@@ -0,0 +1,385 @@
+"""
+Reader-study analytics for the Turing test.
+
+Every turing_test row records which report was the AI one (assignments)
+and the reader's initial and final pick, but nothing turned that into an
+outcome.  ReaderStudy holds the latest answer of each reader for each case
+as readers x cases int8 arrays, filled incrementally from progress_logs
+(rows above a high-water id, like results_cache), and the metrics below
+work on whole arrays:
+
+    accuracy          picked the ground-truth report (initial / final)
+    change rate       final pick differs from the initial one
+    not sure          answered "Not sure"
+    sensitivity       per reader, "A is the AI report" as the positive
+    specificity       class (a reader who always answers B scores 1 / 0)
+    Cohen's kappa     per reader pair, on the cases both read
+    Fleiss' kappa     all readers, cases read by two or more
+
+Answers are compared as outcomes (picked GT, picked AI, not sure) rather
+than letters, since A and B are shuffled per reader.  Study-level metrics
+get percentile bootstrap intervals from resampling cases, done as one
+multinomial weight matrix times per-case sums; per-reader intervals
+resample each reader's answers.  Pairwise Cohen's kappas are point
+estimates with the number of shared cases.
+
+    python analytics.py [DB] [--boot 1000] [--seed 0] [--readers] [--json out.json]
+    python analytics.py --simulate 300 3000      # timing on a random study
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import db
+from progress_delta import ASSIGNMENT_SQL
+
+CHOICES = {"A": 0, "B": 1, "Not sure": 2}
+MISSING = -1
+# Outcome codes
+PICKED_GT, PICKED_AI, NOT_SURE = 0, 1, 2
+N_OUTCOMES = 3
+
+N_BOOT = 1000
+CONFIDENCE = 0.95
+MIN_SHARED = 5          # pairs sharing fewer cases get no Cohen's kappa
+
+
+# --------------------------------------------------
+# Study arrays
+# --------------------------------------------------
+class ReaderStudy:
+    """Latest turing_test answer per (reader, case), as int8 arrays."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        import numpy as np
+
+        self.readers, self.cases = [], []
+        self._reader_ix, self._case_ix = {}, {}
+        self.initial = np.full((0, 0), MISSING, dtype=np.int8)
+        self.final = np.full((0, 0), MISSING, dtype=np.int8)
+        self.ai_is_a = np.full((0, 0), MISSING, dtype=np.int8)
+        self.high_water = 0
+
+    def _index(self, names: list, ix: dict, name: str) -> int:
+        i = ix.get(name)
+        if i is None:
+            i = ix[name] = len(names)
+            names.append(name)
+        return i
+
+    def _grow(self, shape):
+        """Grow the arrays (doubling) to hold at least shape; new cells are MISSING."""
+        import numpy as np
+
+        rows, cols = self.initial.shape
+        if rows >= shape[0] and cols >= shape[1]:
+            return
+        new = (max(shape[0], rows * 2 if rows < shape[0] else rows, 8),
+               max(shape[1], cols * 2 if cols < shape[1] else cols, 8))
+        for name in ("initial", "final", "ai_is_a"):
+            old = getattr(self, name)
+            arr = np.full(new, MISSING, dtype=np.int8)
+            arr[:rows, :cols] = old
+            setattr(self, name, arr)
+
+    def add(self, rows):
+        """Apply (reader, case, initial, final, ai_is_a) rows in id order."""
+        import numpy as np
+
+        if not rows:
+            return
+        r = np.fromiter((self._index(self.readers, self._reader_ix, row[0]) for row in rows),
+                        dtype=np.int64, count=len(rows))
+        c = np.fromiter((self._index(self.cases, self._case_ix, row[1]) for row in rows),
+                        dtype=np.int64, count=len(rows))
+        self._grow((len(self.readers), len(self.cases)))
+        code = CHOICES.get
+        # Later rows win: fancy assignment applies duplicates in order
+        self.initial[r, c] = [code(row[2], MISSING) for row in rows]
+        self.final[r, c] = [code(row[3], MISSING) for row in rows]
+        self.ai_is_a[r, c] = [MISSING if row[4] is None else int(bool(row[4])) for row in rows]
+
+    def refresh(self, db_path: str):
+        """Read turing_test rows written since the last refresh."""
+        with self.lock, db.connection(db_path) as conn:
+            max_id = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM progress_logs WHERE category='turing_test'"
+            ).fetchone()[0]
+            if max_id < self.high_water:
+                # Database was replaced or rows were deleted: start over
+                self._reset()
+            if max_id == self.high_water:
+                return self
+            # The assignment flag for the row's own case is read in SQLite,
+            # without parsing a full-snapshot row's map in Python
+            cur = conn.execute(
+                f"SELECT session_id, case_id, initial_eval, final_eval, {ASSIGNMENT_SQL} "
+                "FROM progress_logs "
+                "WHERE category='turing_test' AND id>? AND id<=? "
+                "  AND session_id IS NOT NULL AND case_id IS NOT NULL "
+                "ORDER BY id",
+                (self.high_water, max_id),
+            )
+            while True:
+                rows = cur.fetchmany(10000)
+                if not rows:
+                    break
+                self.add(rows)
+            self.high_water = max_id
+        return self
+
+    def arrays(self):
+        """(initial, final, ai_is_a) trimmed to the known readers and cases."""
+        shape = (len(self.readers), len(self.cases))
+        return (self.initial[:shape[0], :shape[1]], self.final[:shape[0], :shape[1]],
+                self.ai_is_a[:shape[0], :shape[1]])
+
+
+_studies = {}
+_studies_lock = threading.Lock()
+
+
+def get_study(db_path: str) -> ReaderStudy:
+    """Process-wide study for db_path, brought up to date."""
+    key = os.path.abspath(db_path)
+    with _studies_lock:
+        study = _studies.get(key)
+        if study is None:
+            study = _studies[key] = ReaderStudy()
+    return study.refresh(db_path)
+
+
+# --------------------------------------------------
+# Metrics
+# --------------------------------------------------
+def outcomes(choice, ai_is_a):
+    """Outcome codes from letter picks; MISSING where either side is unknown."""
+    import numpy as np
+
+    out = np.where(choice == CHOICES["Not sure"], NOT_SURE,
+                   np.where(choice == ai_is_a, PICKED_GT, PICKED_AI)).astype(np.int8)
+    out[(choice == MISSING) | (ai_is_a == MISSING)] = MISSING
+    return out
+
+
+def _interval(samples, confidence=CONFIDENCE):
+    import numpy as np
+
+    tail = (1 - confidence) / 2 * 100
+    lo, hi = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    return lo, hi
+
+
+def _ratio(num, den):
+    import numpy as np
+
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=np.float64), np.asarray(den, dtype=np.float64))
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def fleiss_kappa(counts, weights=None):
+    """
+    Fleiss' kappa from per-case outcome counts (cases x outcomes), for a
+    varying number of readers per case.  weights (boot x cases) gives one
+    kappa per row of weights.
+    """
+    import numpy as np
+
+    counts = counts.astype(np.float64)
+    n = counts.sum(axis=1)
+    rated = n >= 2
+    agree = _ratio((counts * (counts - 1)).sum(axis=1), n * (n - 1)) * rated
+    if weights is None:
+        weights = np.ones((1, len(n)))
+    p_bar = _ratio(weights @ np.where(rated, agree, 0), weights @ rated)
+    p_k = _ratio(weights @ (counts * rated[:, None]), (weights @ (n * rated))[:, None])
+    p_e = (p_k ** 2).sum(axis=1)
+    return _ratio(p_bar - p_e, 1 - p_e)
+
+
+def cohen_matrix(codes, min_shared: int = MIN_SHARED):
+    """Pairwise Cohen's kappa (readers x readers) and the shared case counts."""
+    import numpy as np
+
+    answered = (codes != MISSING).astype(np.float32)
+    onehot = [(codes == k).astype(np.float32) for k in range(N_OUTCOMES)]
+    shared = answered @ answered.T
+    agree = sum(o @ o.T for o in onehot)
+    # Each reader's outcome mix on the cases shared with the other
+    expected = sum((o @ answered.T) * (answered @ o.T) for o in onehot)
+    p_o = _ratio(agree, shared)
+    p_e = _ratio(expected, shared ** 2)
+    kappa = _ratio(p_o - p_e, 1 - p_e)
+    kappa[shared < min_shared] = np.nan
+    np.fill_diagonal(kappa, np.nan)
+    return kappa, shared.astype(np.int64)
+
+
+def summary(study: ReaderStudy, n_boot: int = N_BOOT, seed: int = 0,
+            confidence: float = CONFIDENCE) -> dict:
+    """Study-level metrics: {name: {"value", "lo", "hi", "n"}} plus sizes and timing."""
+    import numpy as np
+
+    t0 = time.perf_counter()
+    initial, final, ai_is_a = study.arrays()
+    first, last = outcomes(initial, ai_is_a), outcomes(final, ai_is_a)
+    answered = first != MISSING
+    both = answered & (last != MISSING)
+    # Per-case sums; every metric is a ratio of two weighted sums of these
+    per_case = {
+        "answered":     answered.sum(axis=0),
+        "correct":      (first == PICKED_GT).sum(axis=0),
+        "not_sure":     (first == NOT_SURE).sum(axis=0),
+        "both":         both.sum(axis=0),
+        "changed":      (both & (initial != final)).sum(axis=0),
+        "final_correct": (both & (last == PICKED_GT)).sum(axis=0),
+        "init_correct_both": (both & (first == PICKED_GT)).sum(axis=0),
+    }
+    n_cases = initial.shape[1]
+    rng = np.random.default_rng(seed)
+    weights = np.vstack([np.ones(n_cases), rng.multinomial(n_cases, np.full(n_cases, 1 / n_cases), size=n_boot)]) \
+        if n_cases else np.ones((1, 0))
+    s = {k: weights @ v.astype(np.float64) for k, v in per_case.items()}
+    metrics = {
+        "accuracy_initial": (_ratio(s["correct"], s["answered"]), per_case["answered"].sum()),
+        "accuracy_final":   (_ratio(s["final_correct"], s["both"]), per_case["both"].sum()),
+        "accuracy_gain":    (_ratio(s["final_correct"] - s["init_correct_both"], s["both"]), per_case["both"].sum()),
+        "change_rate":      (_ratio(s["changed"], s["both"]), per_case["both"].sum()),
+        "not_sure_rate":    (_ratio(s["not_sure"], s["answered"]), per_case["answered"].sum()),
+    }
+    counts = np.stack([(first == k).sum(axis=0) for k in range(N_OUTCOMES)], axis=1)
+    metrics["fleiss_kappa"] = (fleiss_kappa(counts, weights), int((counts.sum(axis=1) >= 2).sum()))
+    out = {}
+    for name, (values, n) in metrics.items():
+        lo, hi = _interval(values[1:], confidence) if n_boot else (np.nan, np.nan)
+        out[name] = {"value": _float(values[0]), "lo": _float(lo), "hi": _float(hi), "n": int(n)}
+    kappa, _ = cohen_matrix(first)
+    out["cohen_kappa_mean"] = {"value": _float(np.nanmean(kappa)) if np.isfinite(kappa).any() else None,
+                               "lo": None, "hi": None, "n": int(np.isfinite(kappa).sum() // 2)}
+    return {"readers": initial.shape[0], "cases": n_cases, "boot": n_boot, "confidence": confidence,
+            "metrics": out, "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def per_reader(study: ReaderStudy, n_boot: int = N_BOOT, seed: int = 0,
+               confidence: float = CONFIDENCE) -> list:
+    """One row per reader: answers, accuracy with interval, change rate, sensitivity, specificity."""
+    import numpy as np
+
+    initial, final, ai_is_a = study.arrays()
+    first = outcomes(initial, ai_is_a)
+    answered = first != MISSING
+    n = answered.sum(axis=1)
+    correct = (first == PICKED_GT).sum(axis=1)
+    both = answered & (final != MISSING)
+    changed = (both & (initial != final)).sum(axis=1)
+    positive = answered & (ai_is_a == 1)
+    negative = answered & (ai_is_a == 0)
+    # "A is AI" is called by picking B as the ground truth
+    sens = _ratio((positive & (initial == CHOICES["B"])).sum(axis=1), positive.sum(axis=1))
+    spec = _ratio((negative & (initial == CHOICES["A"])).sum(axis=1), negative.sum(axis=1))
+    acc = _ratio(correct, n)
+    # Resampling a reader's answers is a binomial draw around the observed rate
+    rng = np.random.default_rng(seed)
+    boot = _ratio(rng.binomial(n, np.nan_to_num(acc), size=(max(n_boot, 1), len(n))), n)
+    lo, hi = _interval(boot, confidence)
+    kappa, _ = cohen_matrix(first)
+    mean_kappa = np.full(len(n), np.nan)
+    has = np.isfinite(kappa).any(axis=1)
+    mean_kappa[has] = np.nanmean(kappa[has], axis=1)
+    return [
+        {"reader": reader, "answered": int(n[i]), "accuracy": _float(acc[i]),
+         "accuracy_lo": _float(lo[i]), "accuracy_hi": _float(hi[i]),
+         "change_rate": _float(_ratio(changed[i], both[i].sum())),
+         "sensitivity": _float(sens[i]), "specificity": _float(spec[i]),
+         "mean_kappa": _float(mean_kappa[i])}
+        for i, reader in enumerate(study.readers)
+    ]
+
+
+def _float(x):
+    x = float(x)
+    return None if x != x else round(x, 4)
+
+
+def simulate(readers: int, cases: int, seed: int = 0) -> ReaderStudy:
+    """A random study of the given size (for timing the metrics)."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    study = ReaderStudy()
+    study.readers = [f"reader{i:04d}" for i in range(readers)]
+    study.cases = [f"case{i:05d}" for i in range(cases)]
+    study.ai_is_a = rng.integers(0, 2, size=(readers, cases), dtype=np.int8)
+    skill = rng.uniform(0.4, 0.9, size=(readers, 1))
+    right = rng.random((readers, cases)) < skill
+    study.initial = np.where(right, study.ai_is_a, 1 - study.ai_is_a).astype(np.int8)
+    study.initial[rng.random((readers, cases)) < 0.1] = CHOICES["Not sure"]
+    study.final = study.initial.copy()
+    flip = rng.random((readers, cases)) < 0.15
+    study.final[flip] = study.ai_is_a[flip]
+    study.initial[rng.random((readers, cases)) < 0.3] = MISSING
+    study.final[study.initial == MISSING] = MISSING
+    return study
+
+
+# --------------------------------------------------
+# Admin page
+# --------------------------------------------------
+def render_analytics(db_path: str):
+    """Study summary and per-reader table (admins only)."""
+    import streamlit as st
+
+    with st.expander("Reader-study analytics"):
+        c1, c2 = st.columns(2)
+        n_boot = c1.select_slider("Bootstrap replicates", [0, 200, 1000, 5000], value=N_BOOT, key="an_boot")
+        seed = c2.number_input("Seed", value=0, step=1, key="an_seed")
+        study = get_study(db_path)
+        if not study.readers:
+            st.write("— no Turing test answers yet —")
+            return
+        s = summary(study, n_boot, int(seed))
+        st.caption(f"{s['readers']} readers × {s['cases']} cases, {s['boot']} replicates, "
+                   f"{int(s['confidence'] * 100)}% intervals, {s['seconds'] * 1000:.0f} ms")
+        st.dataframe([{"metric": k, **v} for k, v in s["metrics"].items()], hide_index=True)
+        st.dataframe(per_reader(study, n_boot, int(seed)), hide_index=True)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Turing-test reader-study metrics.")
+    p.add_argument("db", nargs="?", default=os.path.join("logs", "logs.db"))
+    p.add_argument("--boot", type=int, default=N_BOOT, help="bootstrap replicates (0 = none)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--confidence", type=float, default=CONFIDENCE)
+    p.add_argument("--readers", action="store_true", help="also print the per-reader table")
+    p.add_argument("--simulate", nargs=2, type=int, metavar=("READERS", "CASES"),
+                   help="use a random study of this size instead of the database")
+    p.add_argument("--json", help="write the results here")
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    study = simulate(*args.simulate, seed=args.seed) if args.simulate else get_study(args.db)
+    loaded = time.perf_counter() - t0
+    result = summary(study, args.boot, args.seed, args.confidence)
+    print(f"{result['readers']} readers x {result['cases']} cases; loaded in {loaded:.2f}s, "
+          f"metrics in {result['seconds']:.2f}s ({args.boot} replicates)")
+    for name, m in result["metrics"].items():
+        ci = f"  [{m['lo']}, {m['hi']}]" if m["lo"] is not None else ""
+        print(f"  {name:<18}{m['value']!s:>8}{ci}  n={m['n']}")
+    if args.readers or args.json:
+        t1 = time.perf_counter()
+        result["per_reader"] = per_reader(study, args.boot, args.seed, args.confidence)
+        print(f"per-reader table in {time.perf_counter() - t1:.2f}s")
+        if args.readers:
+            for row in result["per_reader"]:
+                print("  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,213 @@
+"""
+Log-structured store for per-case corrections.
+
+save_annotations used to re-read and rewrite evaluations/{case_id}_annotations.json
+and then insert the same data into the SQLite annotations table.  Two
+annotators submitting the same case could lose each other's rewrite.
+
+All submissions now go to one append-only log, evaluations/annotations.log,
+one JSON line per submit.  Each append is a single O_APPEND write under a
+file lock, and its (offset, length) is recorded in annotations.idx so a
+case's entries are read without scanning the log.  The per-case JSON files
+are an export produced on demand.
+
+    python annotation_store.py import [DIR]     # load legacy *_annotations.json files
+    python annotation_store.py export [CASE ...]  # write per-case JSON files
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:   # Windows: in-process locking only
+    fcntl = None
+
+STORE_DIR = "evaluations"
+LOG_NAME = "annotations.log"
+INDEX_NAME = "annotations.idx"
+
+
+class AnnotationStore:
+
+    def __init__(self, directory: str = STORE_DIR):
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self._lock = threading.Lock()
+        self._offsets = {}        # case_id -> [(offset, length), ...]
+        self._index_pos = 0       # bytes of the index file already loaded
+        self._log_end = 0         # end of the last log entry seen in the index
+
+    # -------- locking / index maintenance --------
+    def _flock(self, fd, exclusive: bool):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _funlock(self, fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Load index lines written since the last call (by any process)."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_pos)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            case_id, offset, length = line.decode("utf-8").rsplit("\t", 2)
+            offset, length = int(offset), int(length)
+            self._offsets.setdefault(case_id, []).append((offset, length))
+            self._log_end = max(self._log_end, offset + length)
+        self._index_pos += end
+
+    def _recover(self, log_fd, idx_fd):
+        """Index log entries written before a crash cut off their index line."""
+        size = os.fstat(log_fd).st_size
+        if size <= self._log_end:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_end)
+            offset = self._log_end
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    case_id = json.loads(raw)["case_id"]
+                except (ValueError, KeyError):
+                    offset += len(raw)
+                    continue
+                os.write(idx_fd, f"{case_id}\t{offset}\t{len(raw)}\n".encode("utf-8"))
+                offset += len(raw)
+        self._refresh()
+
+    def _has_op(self, case_id: str, op_id: str) -> bool:
+        """Whether case_id already holds the entry written by operation op_id."""
+        spans = self._offsets.get(case_id)
+        if not spans:
+            return False
+        needle = json.dumps(op_id).encode("utf-8")
+        with open(self.log_path, "rb") as f:
+            for offset, length in spans:
+                f.seek(offset)
+                raw = f.read(length)
+                if needle in raw and json.loads(raw).get("op") == op_id:
+                    return True
+        return False
+
+    # -------- public API --------
+    def append(self, case_id: str, annotations: list, op_id: str = None) -> bool:
+        """
+        Append one submission.  With op_id (the write queue's id for the
+        operation) a replayed submission already in the log is skipped;
+        returns False then.
+        """
+        entry = {"case_id": case_id, "ts": time.time(), "annotations": annotations}
+        if op_id:
+            entry["op"] = op_id
+        data = (json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            log_fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            idx_fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                self._flock(log_fd, exclusive=True)
+                self._refresh()
+                self._recover(log_fd, idx_fd)
+                if op_id and self._has_op(case_id, op_id):
+                    return False
+                offset = os.fstat(log_fd).st_size
+                os.write(log_fd, data)
+                os.write(idx_fd, f"{case_id}\t{offset}\t{len(data)}\n".encode("utf-8"))
+                self._refresh()
+            finally:
+                self._funlock(log_fd)
+                os.close(idx_fd)
+                os.close(log_fd)
+        return True
+
+    def entries(self, case_id: str) -> list:
+        """Every submission for case_id, oldest first."""
+        with self._lock:
+            self._refresh()
+            spans = list(self._offsets.get(case_id, ()))
+        if not spans:
+            return []
+        out = []
+        with open(self.log_path, "rb") as f:
+            for offset, length in spans:
+                f.seek(offset)
+                out.append(json.loads(f.read(length)))
+        return out
+
+    def read_case(self, case_id: str) -> list:
+        """Flat list of corrections for case_id, as the old per-case JSON held them."""
+        return [a for e in self.entries(case_id) for a in e["annotations"]]
+
+    def case_ids(self) -> list:
+        with self._lock:
+            self._refresh()
+            return sorted(self._offsets)
+
+    def iter_entries(self):
+        """Scan the whole log in write order."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            for raw in f:
+                if raw.endswith(b"\n"):
+                    yield json.loads(raw)
+
+    def export_case(self, case_id: str, out_dir: str = None) -> str:
+        out_dir = out_dir or self.directory
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{case_id}_annotations.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.read_case(case_id), f, indent=2)
+        os.replace(tmp, path)
+        return path
+
+    def import_legacy(self, directory: str = None) -> int:
+        """Append legacy per-case JSON files for cases the store does not know yet."""
+        known = set(self.case_ids())
+        count = 0
+        for path in sorted(glob.glob(os.path.join(directory or self.directory, "*_annotations.json"))):
+            case_id = os.path.basename(path)[:-len("_annotations.json")]
+            if case_id in known:
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.append(case_id, data if isinstance(data, list) else [data])
+            count += 1
+        return count
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(directory: str = STORE_DIR) -> AnnotationStore:
+    key = os.path.abspath(directory)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = AnnotationStore(directory)
+        return store
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    store = get_store()
+    if cmd == "import":
+        print(f"imported {store.import_legacy(sys.argv[2] if len(sys.argv) > 2 else None)} cases")
+    elif cmd == "export":
+        for case_id in sys.argv[2:] or store.case_ids():
+            print(store.export_case(case_id))
+    else:
+        sys.exit("usage: python annotation_store.py import [DIR] | export [CASE ...]")
@@ -1,30 +1,41 @@
 import re
 import os
 import json
-import random
-import sqlite3
 from datetime import datetime
 
 import streamlit as st
-import pandas as pd
 import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
-from streamlit_authenticator.utilities.hasher import Hasher
+
+from analytics import render_analytics
+from assignment import ai_first, study_settings
+from backend import get_backend
+from credentials import load_config
+from export import render_export
+from manifest import load_manifest
+from profiling import (
+    configure as configure_profiling, finish_rerun, is_admin, render_panel, span, start_rerun, timed,
+)
+from report_cache import read_report
+from results import render_explorer, render_overview
+from slice_pack import display_slices
+from slice_viewer import slice_viewer
+from write_queue import get_queue, spool_path, submit_annotations, submit_progress
 
 # ─── For unique session IDs ────────────────────────────────────────────────────
 from streamlit.runtime import get_instance
 from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # ─── 0. Authentication Setup ───────────────────────────────────────────────────
-with open("config.yaml") as file:
-    config = yaml.load(file, Loader=SafeLoader)
+start_rerun(st.session_state)
+# Passwords come back already hashed; bcrypt only runs when config.yaml changes
+with span("credentials"):
+    config = load_config("config.yaml")
+configure_profiling(config)
 
 if "credentials" not in config or "usernames" not in config["credentials"]:
     st.error("❌ Your config.yaml must include a 'credentials → usernames' section.")
     st.stop()
 
-config["credentials"] = Hasher.hash_passwords(config["credentials"])
 authenticator = stauth.Authenticate(
     credentials        = config["credentials"],
     cookie_name        = config["cookie"]["name"],
@@ -32,7 +43,8 @@ authenticator = stauth.Authenticate(
     cookie_expiry_days = config["cookie"]["expiry_days"],
     preauthorized      = config.get("preauthorized", [])
 )
-authenticator.login(location="sidebar", key="login")
+with span("auth.login"):
+    authenticator.login(location="sidebar", key="login")
 
 name                  = st.session_state.get("name")
 authentication_status = st.session_state.get("authentication_status")
@@ -62,121 +74,13 @@ unique_sid = get_unique_user_session()
 st.session_state.session_id = f"{username}_{unique_sid}"
 st.sidebar.markdown(f"**Session ID:** `{st.session_state.session_id}`")
 
-# ─── 2. Database Init & Helpers ─────────────────────────────────────────────────
-DB_DIR = os.path.join(os.getcwd(), "db")
-DB_PATH = os.path.join(DB_DIR, "progress.db")
-
-def get_db_connection():
-    os.makedirs(DB_DIR, exist_ok=True)
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS progress_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            category TEXT NOT NULL,
-            progress_json TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS annotations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            case_id TEXT NOT NULL,
-            annotations_json TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-init_db()
-
-def should_log(session_id: str, category: str, new_prog: dict) -> bool:
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "SELECT progress_json FROM progress_logs "
-        "WHERE session_id=? AND category=? "
-        "ORDER BY timestamp DESC LIMIT 1",
-        (session_id, category)
-    )
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        return True
-    last = json.loads(row[0])
-    if "last_case" in new_prog:
-        return last.get("last_case") != new_prog.get("last_case")
-    if category == "ai_edit" and "case_id" in new_prog:
-        return last.get("case_id") != new_prog.get("case_id")
-    return True
-
-def save_progress(category: str, progress: dict):
-    sid = st.session_state.session_id
-    if not should_log(sid, category, progress):
-        return
-    # JSON
-    os.makedirs(DB_DIR, exist_ok=True)
-    jpath = os.path.join(DB_DIR, f"{category}_{sid}_progress.json")
-    if os.path.exists(jpath):
-        with open(jpath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            data = data if isinstance(data, list) else [data]
-    else:
-        data = []
-    data.append(progress)
-    with open(jpath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-    # CSV
-    cpath = os.path.join(DB_DIR, f"{category}_{sid}_progress.csv")
-    df = pd.DataFrame([progress])
-    if os.path.exists(cpath):
-        df.to_csv(cpath, index=False, mode="a", header=False)
-    else:
-        df.to_csv(cpath, index=False)
-    # SQLite
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO progress_logs(session_id, category, progress_json) VALUES (?, ?, ?)",
-        (sid, category, json.dumps(progress))
-    )
-    conn.commit()
-    conn.close()
-
-def save_annotations(case_id: str, annotations: list):
-    os.makedirs("evaluations", exist_ok=True)
-    path = os.path.join("evaluations", f"{case_id}_annotations.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            data = data if isinstance(data, list) else [data]
-    else:
-        data = []
-    data.extend(annotations)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO annotations(case_id, annotations_json) VALUES (?, ?)",
-        (case_id, json.dumps(annotations))
-    )
-    conn.commit()
-    conn.close()
-
-# ─── 3. Save Progress on Logout ─────────────────────────────────────────────────
+# ─── 2. Save Progress on Logout ─────────────────────────────────────────────────
 def save_all_progress(_=None):
     if (st.session_state.initial_eval_turing is not None
         or st.session_state.viewed_images_turing):
         prog = {
-            "case_id":      st.session_state.last_case_turing,
+            "case_id":      case_at(st.session_state.last_case_turing),
             "last_case":    st.session_state.last_case_turing,
-            "assignments":  st.session_state.assignments_turing,
             "initial_eval": st.session_state.initial_eval_turing,
             "final_eval":   st.session_state.final_eval_turing,
             "viewed_images":st.session_state.viewed_images_turing,
@@ -185,9 +89,8 @@ def save_all_progress(_=None):
 
     if st.session_state.corrections_standard:
         prog = {
-            "case_id":     st.session_state.last_case_standard,
+            "case_id":     case_at(st.session_state.last_case_standard),
             "last_case":   st.session_state.last_case_standard,
-            "assignments": st.session_state.assignments_standard,
             "corrections": st.session_state.corrections_standard,
         }
         save_progress("standard_evaluation", prog)
@@ -195,22 +98,13 @@ def save_all_progress(_=None):
     if (st.session_state.assembled_ai
         or st.session_state.corrections_ai):
         prog = {
-            "case_id":    st.session_state.last_case_ai,
+            "case_id":    case_at(st.session_state.last_case_ai),
             "mode":       st.session_state.get("last_mode_ai", "Free"),
             "assembled":  st.session_state.assembled_ai,
             "corrections":st.session_state.corrections_ai,
         }
         save_progress("ai_edit", prog)
 
-# ─── 4. Single Logout Button with Unique Key ────────────────────────────────────
-logout_key = f"auth_logout_{st.session_state.session_id}"
-authenticator.logout(
-    location="sidebar",
-    key=logout_key,
-    callback=save_all_progress
-)
-
-
 # --------------------------------------------------
 # 1. Session ID per user (persist across logins)
 # --------------------------------------------------
@@ -224,219 +118,146 @@ st.sidebar.markdown(f"**Session ID:** `{st.session_state.session_id}`")
 DB_DIR = "logs"
 DB_PATH = os.path.join(DB_DIR, "logs.db")
 
-def get_db_connection():
-    os.makedirs(DB_DIR, exist_ok=True)
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS progress_logs (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      session_id TEXT,
-      category TEXT,
-      progress_json TEXT,
-      timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )''')
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS annotations (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      case_id TEXT,
-      annotations_json TEXT,
-      timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )''')
-    conn.commit()
-    conn.close()
-
-init_db()
+# Local SQLite or a shared store server, per config.yaml (see backend.py)
+backend = get_backend(config)
 
-# --------------------------------------------------
-# 3. Load last saved 'last_case' from DB
-# --------------------------------------------------
-def load_last_progress(category: str) -> int:  # ← NEW
-    """
-    Return the last_case index for this user & category, or 0 if none.
-    """
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "SELECT progress_json FROM progress_logs "
-        "WHERE session_id=? AND category=? "
-        "ORDER BY timestamp DESC LIMIT 1",
-        (st.session_state.session_id, category)
-    )
-    row = c.fetchone()
-    conn.close()
-    if row:
-        data = json.loads(row[0])
-        return data.get("last_case", 0)
-    return 0
+# Tables, columns and indexes come from numbered migrations, applied once
+# per process; the first run also folds db/progress.db in (see migrations.py)
+with span("migrations"):
+    backend.prepare(DB_PATH)
+
+# Saves are applied by a background worker (see write_queue.py)
+writes = get_queue(spool_path(DB_DIR, "app1"), backend)
+
+pending_saves = writes.backlog()
+if pending_saves:
+    st.sidebar.caption(f"💾 {pending_saves} saves pending")
+if is_admin(config, username):
+    render_panel(st.session_state)
 
 # --------------------------------------------------
-# 4. Helper: Prevent Duplicate SQLite Inserts
+# 3. Load saved resume state from DB
 # --------------------------------------------------
-def should_log(session_id: str, category: str, new_progress: dict) -> bool:
+def load_resume(user: str) -> dict:
     """
-    Skip logging if the latest saved entry for this session/category
-    has the same last_case (for evals) or same case_id (for AI-edit).
+    {category: {last_case, current_slice, pending_corrections}} for this user,
+    read from the resume_state table in one primary-key lookup.
     """
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "SELECT progress_json FROM progress_logs "
-        "WHERE session_id=? AND category=? "
-        "ORDER BY timestamp DESC LIMIT 1",
-        (session_id, category)
-    )
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        return True
-    last = json.loads(row[0])
-    if "last_case" in new_progress:
-        return last.get("last_case") != new_progress.get("last_case")
-    if category == "ai_edit" and "case_id" in new_progress:
-        return last.get("case_id") != new_progress.get("case_id")
-    return True
+    writes.flush(timeout=5, session_id=user)   # don't resume from behind this user's own saves
+    return backend.load_resume(DB_PATH, user)
 
 # --------------------------------------------------
-# 5. Utilities to Save Progress & Annotations
+# 4. Utilities to Save Progress & Annotations
 # --------------------------------------------------
-def save_progress(category: str, progress: dict):
-    sid = st.session_state.session_id
-    if not should_log(sid, category, progress):
-        return
-
-    # JSON file
-    os.makedirs(DB_DIR, exist_ok=True)
-    jpath = os.path.join(DB_DIR, f"{category}_{sid}_progress.json")
-    if os.path.exists(jpath):
-        with open(jpath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            data = data if isinstance(data, list) else [data]
-    else:
-        data = []
-    data.append(progress)
-    with open(jpath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-    # CSV file
-    cpath = os.path.join(DB_DIR, f"{category}_{sid}_progress.csv")
-    df = pd.DataFrame([progress])
-    if os.path.exists(cpath):
-        df.to_csv(cpath, index=False, mode="a", header=False)
-    else:
-        df.to_csv(cpath, index=False)
-
-    # SQLite
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO progress_logs(session_id, category, progress_json) VALUES (?, ?, ?)",
-        (sid, category, json.dumps(progress))
+# Session-state key holding the open slice for each progress category
+SLICE_KEYS = {
+    "turing_test": "current_slice_turing",
+    "standard_evaluation": "current_slice_standard",
+    "ai_edit": "current_slice_ai",
+}
+
+def save_progress(category: str, progress: dict, pending=None):
+    # Duplicate check, JSONL/CSV copies and SQLite run on the write-behind worker
+    submit_progress(
+        writes, DB_PATH, DB_DIR, st.session_state.session_id, category, progress,
+        st.session_state.get(SLICE_KEYS[category], 0), pending,
     )
-    conn.commit()
-    conn.close()
 
 def save_annotations(case_id: str, annotations: list):
-    os.makedirs("evaluations", exist_ok=True)
-    path = os.path.join("evaluations", f"{case_id}_annotations.json")
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            data = data if isinstance(data, list) else [data]
-    else:
-        data = []
-    data.extend(annotations)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO annotations(case_id, annotations_json) VALUES (?, ?)",
-        (case_id, json.dumps(annotations))
-    )
-    conn.commit()
-    conn.close()
+    submit_annotations(writes, "evaluations", case_id, annotations)
+
+BASE_IMAGE_DIR = "2D_Image_clean"
+with span("manifest"):
+    manifest = load_manifest(BASE_IMAGE_DIR)
+cases = manifest.case_ids
+total_cases = len(cases)
+
+def case_at(idx: int):
+    # Progress rows carry the case id; past the last case keep the index
+    return cases[idx] if 0 <= idx < total_cases else idx
+
+# ─── Single Logout Button with Unique Key ───────────────────────────────────────
+# save_all_progress runs inside logout(), so the queue, save helpers and
+# case list above must already be defined
+logout_key = f"auth_logout_{st.session_state.session_id}"
+authenticator.logout(
+    location="sidebar",
+    key=logout_key,
+    callback=save_all_progress
+)
 
 # --------------------------------------------------
-# 6. Initialize per-workflow Session State
+# 5. Initialize per-workflow Session State
 # --------------------------------------------------
 def init_state(key, default):
     if key not in st.session_state:
         st.session_state[key] = default
 
-# Seed last_case_* from database so user can resume
-init_state("last_case_turing",    load_last_progress("turing_test"))        # ← CHANGED
-init_state("current_slice_turing", 0)
-init_state("assignments_turing",   {})
+# Seed workflow state from the database so user can resume; only read
+# once per session, not on every rerun
+resume = {} if "last_case_turing" in st.session_state else load_resume(st.session_state.session_id)
+r_turing   = resume.get("turing_test", {})
+r_standard = resume.get("standard_evaluation", {})
+r_ai       = resume.get("ai_edit", {})
+
+init_state("last_case_turing",     r_turing.get("last_case", 0))
+init_state("current_slice_turing", r_turing.get("current_slice", 0))
 init_state("initial_eval_turing",  None)
 init_state("final_eval_turing",    None)
 init_state("viewed_images_turing", False)
 
-init_state("last_case_standard",   load_last_progress("standard_evaluation")) # ← CHANGED
-init_state("current_slice_standard", 0)
-init_state("assignments_standard",   {})
-init_state("corrections_standard",   [])
+init_state("last_case_standard",     r_standard.get("last_case", 0))
+init_state("current_slice_standard", r_standard.get("current_slice", 0))
+init_state("corrections_standard",   r_standard.get("pending_corrections", []))
 
-init_state("last_case_ai",         load_last_progress("ai_edit"))           # ← CHANGED
-init_state("current_slice_ai",       0)
-init_state("corrections_ai",         [])
-init_state("assembled_ai",          "")
+init_state("last_case_ai",         r_ai.get("last_case", 0))
+init_state("current_slice_ai",     r_ai.get("current_slice", 0))
+init_state("corrections_ai",       r_ai.get("pending_corrections", []))
+init_state("assembled_ai",         "")
 
 # --------------------------------------------------
-# 7. Routing Setup & Helpers
+# 6. Routing Setup & Helpers
 # --------------------------------------------------
 # Ensure a default page is set once
 if "page" not in st.session_state:
     st.session_state.page = "index"
 
-BASE_IMAGE_DIR = "2D_Image_clean"
-cases = sorted([
-    d for d in os.listdir(BASE_IMAGE_DIR)
-    if os.path.isdir(os.path.join(BASE_IMAGE_DIR, d))
-])
-total_cases = len(cases)
+# A/B order of the AI report, derived per reader and case (see assignment.py)
+try:
+    study = study_settings(config)
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
 
+@timed("load_text")
 def load_text(path):
-    return open(path, "r", encoding="utf-8").read() if os.path.exists(path) else ""
+    # Shared across sessions; re-read only when the file's mtime/size changes
+    return read_report(path)
+
+def show_corrections(cors):
+    # pandas is only imported once a page has corrections to show
+    import pandas as pd
+    st.table(pd.DataFrame(cors).drop(columns=["case_id"]))
 
+@timed("display_carousel")
 def display_carousel(category, case_id):
     key = f"current_slice_{category}"
-    folder = os.path.join(BASE_IMAGE_DIR, case_id)
-    if not os.path.exists(folder):
-        st.info("No images.")
-        return
-    images = sorted([
-        os.path.join(folder, f)
-        for f in os.listdir(folder)
-        if f.lower().endswith((".png", ".jpg", ".jpeg"))
-    ])
+    images = manifest.slice_paths(case_id)
     if not images:
         st.info("No images.")
         return
 
     idx = st.session_state[key]
     idx = max(0, min(idx, len(images)-1))
-    st.session_state[key] = idx
 
-    c1, c2, c3 = st.columns([1,8,1])
-    with c1:
-        if st.button("⟨ Prev", key=f"prev_{category}_{case_id}") and idx > 0:
-            st.session_state[key] -= 1
-            st.rerun()
-    with c2:
-        st.image(images[idx], width=500)
-        st.caption(f"Slice {idx+1}/{len(images)}")
-    with c3:
-        if st.button("Next ⟩", key=f"next_{category}_{case_id}") and idx < len(images)-1:
-            st.session_state[key] += 1
-            st.rerun()
+    # Scrolling happens in the browser; only the settled slice comes back
+    st.session_state[key] = slice_viewer(
+        display_slices(case_id, images), idx, width=500,
+        key=f"viewer_{category}_{case_id}"
+    )
 
 # --------------------------------------------------
-# 8. Pages
+# 7. Pages
 # --------------------------------------------------
 def index():
     st.title("Survey App")
@@ -483,11 +304,8 @@ def turing_test():
 
     gt = load_text(os.path.join(BASE_IMAGE_DIR, case, "text.txt"))
     ai = load_text(os.path.join(BASE_IMAGE_DIR, case, "pred.txt"))
-    assigns = st.session_state.assignments_turing
-    if case not in assigns:
-        assigns[case] = random.choice([True, False])
-        st.session_state.assignments_turing = assigns
-    A, B = (ai, gt) if assigns[case] else (gt, ai)
+    ai_is_a = ai_first(study, username, "turing_test", case, cases)
+    A, B = (ai, gt) if ai_is_a else (gt, ai)
 
     st.subheader("Report A")
     st.text_area("A", A, height=200, key=f"A_t_{case}")
@@ -517,7 +335,7 @@ def turing_test():
             prog = {
                 "case_id": case,
                 "last_case": idx,
-                "assignments": st.session_state.assignments_turing,
+                "assignment": ai_is_a,
                 "initial_eval": st.session_state.initial_eval_turing,
                 "final_eval": st.session_state.final_eval_turing,
                 "viewed_images": st.session_state.viewed_images_turing
@@ -548,11 +366,8 @@ def evaluate_case():
 
     gt = load_text(os.path.join(BASE_IMAGE_DIR, case, "text.txt"))
     ai = load_text(os.path.join(BASE_IMAGE_DIR, case, "pred.txt"))
-    assigns = st.session_state.assignments_standard
-    if case not in assigns:
-        assigns[case] = random.choice([True, False])
-        st.session_state.assignments_standard = assigns
-    A, B = (ai, gt) if assigns[case] else (gt, ai)
+    ai_is_a = ai_first(study, username, "standard_evaluation", case, cases)
+    A, B = (ai, gt) if ai_is_a else (gt, ai)
 
     st.subheader("Report A")
     st.text_area("A", A, height=150, key=f"A_s_{case}")
@@ -578,7 +393,7 @@ def evaluate_case():
 
     cors = [c for c in st.session_state.corrections_standard if c["case_id"] == case]
     if cors:
-        st.table(pd.DataFrame(cors).drop(columns=["case_id"]))
+        show_corrections(cors)
 
     choice = st.radio("Best report?", ["A","B","Corrected","Equal"], key=f"ch_s_{case}")
     if st.button("Submit & Next"):
@@ -587,13 +402,14 @@ def evaluate_case():
         prog = {
             "case_id": case,
             "last_case": idx,
-            "assignments": st.session_state.assignments_standard,
+            "assignment": ai_is_a,
             "corrections": st.session_state.corrections_standard
         }
-        save_progress("standard_evaluation", prog)
-        st.session_state.corrections_standard = [
+        remaining = [
             c for c in st.session_state.corrections_standard if c["case_id"] != case
         ]
+        save_progress("standard_evaluation", prog, pending=remaining)
+        st.session_state.corrections_standard = remaining
         st.session_state.last_case_standard += 1
         st.session_state.current_slice_standard = 0
         st.rerun()
@@ -651,7 +467,7 @@ def ai_edit():
 
         cors = [c for c in st.session_state.corrections_ai if c["case_id"] == case]
         if cors:
-            st.table(pd.DataFrame(cors).drop(columns=["case_id"]))
+            show_corrections(cors)
             if st.button("Assemble"):
                 txt = "\n".join(f"- {c['organ']}: {c['reason']} — {c['details']}" for c in cors)
                 st.session_state.assembled_ai = txt
@@ -665,10 +481,11 @@ def ai_edit():
             "assembled": st.session_state.assembled_ai,
             "corrections": st.session_state.corrections_ai
         }
-        save_progress("ai_edit", prog)
-        st.session_state.corrections_ai = [
+        remaining = [
             c for c in st.session_state.corrections_ai if c["case_id"] != case
         ]
+        save_progress("ai_edit", prog, pending=remaining)
+        st.session_state.corrections_ai = remaining
         st.session_state.assembled_ai = ""
         st.session_state.last_case_ai += 1
         st.session_state.current_slice_ai = 0
@@ -680,79 +497,31 @@ def view_all_results():
         st.session_state.page = "index"
         st.rerun()
 
-    conn = get_db_connection()
-
-    # List all sessions
-    df_sessions = pd.read_sql_query(
-        "SELECT DISTINCT session_id FROM progress_logs ORDER BY session_id",
-        conn
-    )
-    st.subheader("All Sessions with Saved Progress")
-    for sid in df_sessions["session_id"]:
-        st.write(f"- {sid}")
-
-    # Turing & Standard logs
-    for cat,label in [
-        ("turing_test","Turing Test Logs"),
-        ("standard_evaluation","Standard Eval Logs")
-    ]:
-        st.subheader(label)
-        df = pd.read_sql_query(
-            "SELECT session_id, progress_json, timestamp FROM progress_logs WHERE category=? ORDER BY timestamp",
-            conn, params=(cat,)
-        )
-        if not df.empty:
-            df_expanded = pd.concat([
-                df.drop(columns=["progress_json"]),
-                df["progress_json"].apply(json.loads).apply(pd.Series)
-            ], axis=1)
-            for col in df_expanded.columns:
-                if df_expanded[col].apply(lambda x: isinstance(x, (dict,list))).any():
-                    df_expanded[col] = df_expanded[col].apply(json.dumps)
-            if "last_case" in df_expanded.columns:
-                df_expanded["Case"] = df_expanded["last_case"] + 1
-                df_expanded = df_expanded.drop(columns=["last_case"])
-                cols = ["Case"] + [c for c in df_expanded.columns if c!="Case"]
-                st.dataframe(df_expanded[cols])
-            else:
-                st.dataframe(df_expanded)
-        else:
-            st.write("— no entries —")
-
-    # AI Edit Logs
-    st.subheader("AI Report Edit Logs")
-    df_ai = pd.read_sql_query(
-        "SELECT session_id, progress_json, timestamp FROM progress_logs WHERE category='ai_edit' ORDER BY timestamp",
-        conn
-    )
-    if not df_ai.empty:
-        df_ai_expanded = pd.concat([
-            df_ai.drop(columns=["progress_json"]),
-            df_ai["progress_json"].apply(json.loads).apply(pd.Series)
-        ], axis=1)
-        for col in df_ai_expanded.columns:
-            if df_ai_expanded[col].apply(lambda x: isinstance(x, (dict,list))).any():
-                df_ai_expanded[col] = df_ai_expanded[col].apply(json.dumps)
-        st.dataframe(df_ai_expanded)
-    else:
-        st.write("— no AI edit logs found —")
-
-    conn.close()
+    if not backend.reads_locally(DB_PATH):
+        st.info("Results are stored on the store server; open this page on the replica running in its data directory (storage: local_reads: true).")
+        return
+    render_overview(DB_PATH)
+    render_explorer(DB_PATH)
+    if is_admin(config, username):
+        render_analytics(DB_PATH)
+        render_export(DB_PATH, "evaluations", flush=writes.flush)
 
 # --------------------------------------------------
-# 9. Main Router
+# 8. Main Router
 # --------------------------------------------------
 page = st.session_state.page
-if page == "turing_test":
-    turing_test()
-elif page == "standard_eval":
-    evaluate_case()
-elif page == "ai_edit":
-    ai_edit()
-elif page == "view_results":
-    view_all_results()
-else:
-    index()
+with span(f"page.{page}"):
+    if page == "turing_test":
+        turing_test()
+    elif page == "standard_eval":
+        evaluate_case()
+    elif page == "ai_edit":
+        ai_edit()
+    elif page == "view_results":
+        view_all_results()
+    else:
+        index()
+finish_rerun()
 
 
 
@@ -0,0 +1,170 @@
+"""
+Seeded, stateless A/B assignment of the AI report.
+
+The Turing-test and standard-evaluation pages used to flip a coin
+(random.choice) the first time a reader opened a case, keep the result in
+an assignments map in st.session_state and send the whole map with every
+save.  A new browser session drew fresh coins for cases already seen, the
+per-reader split was only 50/50 on average, and the only record of what a
+reader was shown was whatever map reached the database.
+
+The assignment is now a function of (study seed, reader, workflow, case):
+the first bit of HMAC-SHA256 keyed with the seed decides whether the AI
+report is shown as A.  Nothing is stored or sent, the same reader always
+sees the same order, and anyone holding the seed can recompute every
+assignment for an audit.  Each progress row still records its own case's
+assignment as "assignment".
+
+With balanced: true the readers' case lists are cut into blocks of
+`block` cases (in manifest order) and, within each block, the half whose
+HMACs rank lowest get the AI report first.  Every reader then sees the AI
+report first on exactly half of each block, so on half their cases when
+the case count is even.  Balanced assignments depend on the case list, so
+freeze it (and the seed) for the duration of a study.
+
+The seed is a secret (it reveals every assignment), so it is not kept in
+config.yaml: it comes from $CPTA_STUDY_SEED, else the first line of the
+untracked file named by study.seed_file (study_seed.txt).  There is no
+fallback: without a seed study_settings raises and the apps refuse to start,
+rather than derive assignments from a committed value such as cookie.key
+(rotating which would also reshuffle a running study).
+
+config.yaml:
+
+    study:
+      seed_file: study_seed.txt
+      balanced: false
+      block: 4
+
+    python assignment.py [--config config.yaml] [--workflow turing_test] [--users U ...] [--check DB]
+"""
+import argparse
+import hashlib
+import hmac
+import os
+
+BLOCK = 4
+SEED_ENV = "CPTA_STUDY_SEED"
+SEED_FILE = "study_seed.txt"
+WORKFLOWS = ("turing_test", "standard_evaluation")
+
+
+def _read_seed(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.readline().strip()
+    except OSError:
+        return ""
+
+
+def study_settings(config: dict) -> dict:
+    """
+    Seed (bytes), balanced and block; the seed from the environment or seed
+    file.  Raises ValueError when neither is set.
+    """
+    study = config.get("study") or {}
+    seed_file = study.get("seed_file") or SEED_FILE
+    seed = os.environ.get(SEED_ENV) or _read_seed(seed_file)
+    if not seed:
+        raise ValueError(f"no study seed: set ${SEED_ENV} or write one to {seed_file}")
+    return {
+        "seed": str(seed).encode("utf-8"),
+        "balanced": bool(study.get("balanced", False)),
+        "block": max(2, int(study.get("block") or BLOCK)),
+    }
+
+
+def _digest(seed: bytes, user: str, workflow: str, case_id: str) -> bytes:
+    msg = f"{workflow}\0{user}\0{case_id}".encode("utf-8")
+    return hmac.new(seed, msg, hashlib.sha256).digest()
+
+
+def ai_first(settings: dict, user: str, workflow: str, case_id: str, cases=None) -> bool:
+    """
+    True when the AI report is shown as A.  Balanced mode needs the ordered
+    case list; without it (or for a case not in it) the plain hash decides.
+    """
+    seed = settings["seed"]
+    own = _digest(seed, user, workflow, case_id)
+    if not settings["balanced"] or not cases or case_id not in cases:
+        return own[0] >= 128
+    block = settings["block"]
+    start = cases.index(case_id) // block * block
+    members = cases[start:start + block]
+    rank = sum(_digest(seed, user, workflow, c) < own for c in members)
+    half = len(members) // 2
+    if len(members) % 2 and rank == half:
+        return own[0] >= 128    # middle of an odd final block
+    return rank < half
+
+
+def assignments(settings: dict, user: str, workflow: str, cases: list) -> dict:
+    """case_id -> ai_first for a reader's whole case list."""
+    return {c: ai_first(settings, user, workflow, c, cases) for c in cases}
+
+
+def check(db_path: str, settings: dict, users: list, cases: list) -> dict:
+    """
+    Compare the assignment stored on each progress row with the derived
+    one.  Rows are matched to readers by session id (username or
+    username_<session>); others are counted as unattributed.
+    """
+    import db
+    from progress_delta import ASSIGNMENT_SQL
+
+    counts = {"rows": 0, "match": 0, "mismatch": 0, "unattributed": 0}
+    by_length = sorted(users, key=len, reverse=True)
+    with db.connection(db_path) as conn:
+        cur = conn.execute(
+            f"SELECT session_id, category, case_id, {ASSIGNMENT_SQL} FROM progress_logs "
+            f"WHERE category IN ({','.join('?' * len(WORKFLOWS))})",
+            WORKFLOWS,
+        )
+        for session_id, category, case_id, stored in cur:
+            if stored is None:
+                continue
+            counts["rows"] += 1
+            user = next((u for u in by_length if session_id == u or session_id.startswith(u + "_")), None)
+            if user is None:
+                counts["unattributed"] += 1
+            elif bool(stored) == ai_first(settings, user, category, case_id, cases):
+                counts["match"] += 1
+            else:
+                counts["mismatch"] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    import yaml
+
+    from manifest import load_manifest
+
+    p = argparse.ArgumentParser(description="Print or audit the seeded A/B assignments.")
+    p.add_argument("--config", default="config.yaml")
+    p.add_argument("--cases", default="2D_Image_clean", help="image tree whose manifest lists the cases")
+    p.add_argument("--workflow", choices=WORKFLOWS, default=None, help="default: both")
+    p.add_argument("--users", nargs="*", help="default: every account in the config")
+    p.add_argument("--check", metavar="DB", help="compare the assignments stored in DB instead")
+    args = p.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    try:
+        settings = study_settings(config)
+    except ValueError as e:
+        raise SystemExit(f"assignment: {e}")
+    users = args.users or sorted((config.get("credentials") or {}).get("usernames") or {})
+    cases = load_manifest(args.cases).case_ids
+    if args.check:
+        c = check(args.check, settings, users, cases)
+        print(f"{args.check}: {c['rows']} rows, {c['match']} match, {c['mismatch']} differ, "
+              f"{c['unattributed']} not attributable to a user")
+    else:
+        mode = f"balanced, blocks of {settings['block']}" if settings["balanced"] else "unbalanced"
+        print(f"# {len(cases)} cases, {mode}")
+        for workflow in ([args.workflow] if args.workflow else WORKFLOWS):
+            for user in users:
+                a = assignments(settings, user, workflow, cases)
+                print(f"{workflow}\t{user}\tAI first on {sum(a.values())}/{len(a)}")
+                for case_id, first in a.items():
+                    print(f"{workflow}\t{user}\t{case_id}\t{'AI' if first else 'GT'}")
@@ -0,0 +1,407 @@
+"""
+Storage backends: where progress, annotations and resume state live.
+
+Both apps wrote straight to files next to the server: logs/logs.db, the
+per-session JSONL/CSV copies under logs/ and the annotation log under
+evaluations/.  Two Streamlit processes behind a load balancer would each
+keep their own copies and diverge.
+
+Writes and the reads the apps make at login now go through a Backend:
+
+    prepare(db_path)                     migrate the database before first use
+    apply(ops)                           progress and annotation writes, as
+                                         queued by write_queue (one
+                                         transaction per database); returns
+                                         the ops it could not apply
+    load_resume(db_path, user)           resume_state for a user
+    read_annotations(store_dir, case_id) a case's corrections
+
+Paths name the data, as they did before; a backend decides where they are.
+
+SQLiteBackend   the files in this process's working directory (the default)
+RemoteBackend   a store server reached over TCP; each request is one JSON
+                line answered by one JSON line.  Replicas pointed at the
+                same server share one set of files.
+
+The server is a SQLiteBackend behind a threaded socket server, rooted at a
+data directory it will not write outside of.  A batch carries an id, and a
+batch retried after a dropped connection is acknowledged without being
+applied twice.
+
+config.yaml:
+
+    storage:
+      backend: sqlite          # or remote
+      address: 127.0.0.1:8765  # for remote
+      local_reads: false       # remote: this replica runs in the server's data directory
+
+    python backend.py serve [--host 127.0.0.1] [--port 8765] [--root .]
+    python backend.py ping [ADDRESS]
+
+The results, analytics and export pages still read logs/logs.db directly.
+With the remote backend they do so only when local_reads is set; other
+replicas show a note instead, even if an old logs.db is lying around.
+"""
+import abc
+import argparse
+import hashlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+TIMEOUT = 60.0              # seconds per request
+RETRY_SECONDS = 30.0        # keep retrying a write this long while the server is away
+POOL_SIZE = 8
+SEEN_BATCHES = 4096         # batch ids the server remembers for retries
+
+
+class RemoteError(RuntimeError):
+    """An error raised by the store server while handling a request."""
+
+
+class Backend(abc.ABC):
+
+    @abc.abstractmethod
+    def prepare(self, db_path: str):
+        ...
+
+    @abc.abstractmethod
+    def apply(self, ops: list) -> list:
+        """Apply write ops; returns the ones that failed, each with an "error"."""
+
+    @abc.abstractmethod
+    def load_resume(self, db_path: str, user: str) -> dict:
+        ...
+
+    @abc.abstractmethod
+    def read_annotations(self, store_dir: str, case_id: str) -> list:
+        ...
+
+    def reads_locally(self, db_path: str) -> bool:
+        """Whether db_path can be read here (the results pages open it directly)."""
+        return True
+
+    def close(self):
+        pass
+
+
+# --------------------------------------------------
+# Local files
+# --------------------------------------------------
+class SQLiteBackend(Backend):
+    """SQLite through db's pools, the session journals and the annotation log."""
+
+    def prepare(self, db_path: str):
+        from migrations import ensure_migrated
+
+        ensure_migrated(db_path)
+
+    def apply(self, ops: list) -> list:
+        import db
+        from storage import apply_progress, write_annotations
+
+        failed = []
+        by_db = OrderedDict()
+        for op in ops:
+            if op["kind"] == "progress":
+                by_db.setdefault(op["db_path"], []).append(op)
+            elif op["kind"] == "annotations":
+                try:
+                    write_annotations(op["store_dir"], op["case_id"], op["annotations"], op.get("op_id"))
+                except Exception as e:
+                    log.exception("annotation write %s failed", op.get("seq"))
+                    failed.append(dict(op, error=f"{type(e).__name__}: {e}"))
+
+        def one(conn, op):
+            apply_progress(conn, op["log_dir"], op["session_id"], op["category"], op["progress"],
+                           op.get("current_slice", 0), op.get("pending"))
+
+        for db_path, group in by_db.items():
+            try:
+                with db.transaction(db_path) as conn:
+                    for op in group:
+                        one(conn, op)
+            except Exception:
+                # One bad record must not sink the batch: retry individually
+                log.exception("batched progress write failed, retrying one by one")
+                for op in group:
+                    try:
+                        with db.transaction(db_path) as conn:
+                            one(conn, op)
+                    except Exception as e:
+                        log.exception("progress write %s failed", op.get("seq"))
+                        failed.append(dict(op, error=f"{type(e).__name__}: {e}"))
+        return failed
+
+    def load_resume(self, db_path: str, user: str) -> dict:
+        import db
+        from schema import load_resume_state
+
+        with db.connection(db_path) as conn:
+            return load_resume_state(conn, user)
+
+    def read_annotations(self, store_dir: str, case_id: str) -> list:
+        from annotation_store import get_store
+
+        return get_store(store_dir).read_case(case_id)
+
+
+# --------------------------------------------------
+# Client
+# --------------------------------------------------
+def parse_address(address: str):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class RemoteBackend(Backend):
+    """Client for a store server; sockets are pooled and reconnected on error."""
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, timeout: float = TIMEOUT,
+                 local_reads: bool = False):
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self.local_reads = local_reads
+        self.client_id = uuid.uuid4().hex
+        self._idle = []
+        self._lock = threading.Lock()
+        self._ids = 0
+        self._prepared = set()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, sock.makefile("rb")
+
+    def _call_once(self, method: str, params: dict):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._ids += 1
+            req_id = self._ids
+        if conn is None:
+            conn = self._connect()
+        sock, reader = conn
+        try:
+            line = json.dumps({"id": req_id, "method": method, "params": params}, default=str)
+            sock.sendall(line.encode("utf-8") + b"\n")
+            reply = reader.readline()
+            if not reply:
+                raise ConnectionError("store server closed the connection")
+            reply = json.loads(reply)
+        except BaseException:
+            reader.close()
+            sock.close()
+            raise
+        with self._lock:
+            if len(self._idle) < POOL_SIZE:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            reader.close()
+            sock.close()
+        if "error" in reply:
+            raise RemoteError(reply["error"])
+        return reply.get("result")
+
+    def call(self, method: str, params: dict, retry_for: float = 0.0):
+        """One request; connection failures are retried for retry_for seconds."""
+        deadline = time.monotonic() + retry_for
+        delay = 0.1
+        while True:
+            try:
+                return self._call_once(method, params)
+            except OSError:
+                if time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+
+    def prepare(self, db_path: str):
+        # Once per process, like ensure_migrated
+        if db_path not in self._prepared:
+            self.call("prepare", {"db_path": db_path}, RETRY_SECONDS)
+            self._prepared.add(db_path)
+
+    def apply(self, ops: list) -> list:
+        # Same ops, same id: a batch resent after a lost reply is not applied twice
+        digest = hashlib.sha1(json.dumps(ops, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        result = self.call("apply", {"batch": f"{self.client_id}:{digest}", "ops": ops}, RETRY_SECONDS)
+        return result.get("failed", [])
+
+    def load_resume(self, db_path: str, user: str) -> dict:
+        return self.call("load_resume", {"db_path": db_path, "user": user}, 1.0)
+
+    def read_annotations(self, store_dir: str, case_id: str) -> list:
+        return self.call("read_annotations", {"store_dir": store_dir, "case_id": case_id}, 1.0)
+
+    def ping(self) -> dict:
+        return self.call("ping", {})
+
+    def reads_locally(self, db_path: str) -> bool:
+        # Only when configured: a leftover local logs.db would be stale
+        return self.local_reads
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock, reader in idle:
+            reader.close()
+            sock.close()
+
+
+# --------------------------------------------------
+# Server
+# --------------------------------------------------
+PATH_PARAMS = ("db_path", "store_dir", "log_dir")
+
+
+class StoreServer(socketserver.ThreadingTCPServer):
+    """A SQLiteBackend served over TCP, one thread per client connection."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, root: str = "."):
+        super().__init__(address, _Handler)
+        self.root = os.path.realpath(root)
+        self.backend = SQLiteBackend()
+        self.started = time.time()
+        self._seen = OrderedDict()      # batch id -> its reply, oldest first
+        self._seen_lock = threading.Lock()
+
+    def check_path(self, path: str) -> str:
+        full = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([full, self.root]) != self.root:
+            raise ValueError(f"path outside the store root: {path}")
+        return full
+
+    def dispatch(self, method: str, params: dict):
+        for key in PATH_PARAMS:
+            if params.get(key) is not None:
+                params[key] = self.check_path(params[key])
+        if method == "apply":
+            ops = params["ops"]
+            batch = params.get("batch")
+            with self._seen_lock:
+                if batch in self._seen:
+                    return self._seen[batch]
+            # Resolved copies; failures go back with the client's own paths
+            resolved = []
+            for i, op in enumerate(ops):
+                resolved.append(dict(op, _index=i, **{
+                    key: self.check_path(op[key]) for key in PATH_PARAMS if op.get(key) is not None
+                }))
+            unprepared = {}
+            for db_path in {op["db_path"] for op in resolved if op["kind"] == "progress"}:
+                try:
+                    self.backend.prepare(db_path)
+                except Exception as e:
+                    log.exception("prepare %s failed", db_path)
+                    unprepared[db_path] = f"{type(e).__name__}: {e}"
+            failed = [dict(op, error=unprepared[op["db_path"]]) for op in resolved
+                      if op["kind"] == "progress" and op["db_path"] in unprepared]
+            failed += self.backend.apply([op for op in resolved
+                                          if op["kind"] != "progress" or op["db_path"] not in unprepared])
+            failed = [dict(ops[f["_index"]], error=f["error"]) for f in sorted(failed, key=lambda f: f["_index"])]
+            reply = {"applied": len(ops) - len(failed), "failed": failed}
+            if batch:
+                with self._seen_lock:
+                    self._seen[batch] = reply
+                    while len(self._seen) > SEEN_BATCHES:
+                        self._seen.popitem(last=False)
+            return reply
+        if method == "prepare":
+            return self.backend.prepare(params["db_path"])
+        if method == "load_resume":
+            self.backend.prepare(params["db_path"])
+            return self.backend.load_resume(params["db_path"], params["user"])
+        if method == "read_annotations":
+            return self.backend.read_annotations(params["store_dir"], params["case_id"])
+        if method == "ping":
+            return {"root": self.root, "uptime": round(time.time() - self.started, 1)}
+        raise ValueError(f"unknown method: {method}")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        for line in self.rfile:
+            req_id = None
+            try:
+                req = json.loads(line)
+                req_id = req.get("id")
+                reply = {"id": req_id, "result": self.server.dispatch(req["method"], req.get("params") or {})}
+            except Exception as e:
+                log.exception("store request failed")
+                reply = {"id": req_id, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(reply, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, root: str = "."):
+    # Relative paths (and migrations' legacy db/progress.db) resolve under root
+    os.chdir(root)
+    with StoreServer((host, port), ".") as server:
+        log.warning("store server on %s:%d, root %s", host, port, server.root)
+        server.serve_forever()
+
+
+# --------------------------------------------------
+# Selection
+# --------------------------------------------------
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(config: dict = None) -> Backend:
+    """The process-wide backend named by config.yaml's storage: section."""
+    storage = (config or {}).get("storage") or {}
+    kind = storage.get("backend", "sqlite")
+    if kind not in ("sqlite", "remote"):
+        raise ValueError(f"unknown storage backend: {kind}")
+    address = storage.get("address", DEFAULT_ADDRESS)
+    local_reads = bool(storage.get("local_reads", False))
+    key = (address, local_reads) if kind == "remote" else "sqlite"
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _backends[key] = (RemoteBackend(address, local_reads=local_reads)
+                                        if kind == "remote" else SQLiteBackend())
+        return backend
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Run or check the shared store server.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sv = sub.add_parser("serve", help="serve logs/ and evaluations/ under --root over TCP")
+    sv.add_argument("--host", default="127.0.0.1")
+    sv.add_argument("--port", type=int, default=parse_address(DEFAULT_ADDRESS)[1])
+    sv.add_argument("--root", default=".", help="data directory (holds logs/ and evaluations/)")
+    pg = sub.add_parser("ping", help="check that a store server answers")
+    pg.add_argument("address", nargs="?", default=DEFAULT_ADDRESS)
+    args = p.parse_args()
+
+    if args.cmd == "serve":
+        logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+        try:
+            serve(args.host, args.port, args.root)
+        except KeyboardInterrupt:
+            pass
+    else:
+        t0 = time.perf_counter()
+        r = RemoteBackend(args.address).ping()
+        print(f"{args.address}: root {r['root']}, up {r['uptime']}s, "
+              f"{(time.perf_counter() - t0) * 1000:.1f} ms")
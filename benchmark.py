@@ -0,0 +1,304 @@
+"""
+Headless rerun benchmark for app.py and app1.py.
+
+Nothing measured how long a rerun of a page takes.  This drives each app
+through streamlit.testing's AppTest against a throw-away copy of the
+code and a few cases of 2D_Image_clean: log in, open every workflow, page
+through slices, add corrections, submit, and open the results page.
+Every rerun records wall time, files opened, directory listings, bytes and
+syscalls from /proc/self/io (Linux) and SQLite statements executed.
+
+Each app runs in its own subprocess, so module-level caches start cold
+and the two apps cannot share pools or queues.  Saves queued for the
+write-behind worker are flushed after the timed rerun and counted with it.
+
+    python benchmark.py [--apps app.py app1.py] [--cases 3] [--slices 10]
+                        [--user TuringTest --password abc] [--json out.json]
+
+Compare two commits with the JSON output of each.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = "2D_Image_clean"
+COPY_SKIP = {".git", ".cache", "logs", "db", "2D_Image", IMAGE_DIR, "__pycache__"}
+
+
+# --------------------------------------------------
+# Counters (installed in the worker process)
+# --------------------------------------------------
+class Counters:
+    FIELDS = ("opens", "listdirs", "queries", "rchar", "wchar", "syscr", "syscw")
+
+    def __init__(self):
+        self.opens = self.listdirs = self.queries = 0
+        self.enabled = False
+
+    def install(self):
+        import sqlite3
+
+        sys.addaudithook(self._audit)
+        connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(self._trace)
+            return conn
+        sqlite3.connect = traced_connect
+
+    def _audit(self, event, _args):
+        if not self.enabled:
+            return
+        if event == "open":
+            self.opens += 1
+        elif event in ("os.listdir", "os.scandir"):
+            self.listdirs += 1
+
+    def _trace(self, _statement):
+        if self.enabled:
+            self.queries += 1
+
+    @staticmethod
+    def _proc_io() -> dict:
+        try:
+            with open("/proc/self/io", "r") as f:
+                return {k: int(v) for k, v in (line.split(": ") for line in f)}
+        except OSError:
+            return {}
+
+    def snapshot(self) -> dict:
+        io = self._proc_io()
+        return {"opens": self.opens, "listdirs": self.listdirs, "queries": self.queries,
+                **{k: io.get(k, 0) for k in ("rchar", "wchar", "syscr", "syscw")}}
+
+
+# --------------------------------------------------
+# Scripted session
+# --------------------------------------------------
+class StepFailed(Exception):
+    pass
+
+
+class Session:
+    """One simulated reader; every call to step() is one timed rerun."""
+
+    def __init__(self, app_path: str, counters: Counters, timeout: float = 120):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(app_path, default_timeout=timeout)
+        self.counters = counters
+        self.samples = []
+
+    def page(self) -> str:
+        try:
+            return self.at.session_state["page"]
+        except KeyError:
+            return "login"
+
+    def step(self, action: str, prepare=None):
+        from write_queue import flush_all
+
+        if prepare is not None:
+            prepare()
+        before = self.counters.snapshot()
+        self.counters.enabled = True
+        t0 = time.perf_counter()
+        try:
+            self.at.run()
+            wall = time.perf_counter() - t0
+            flush_all(timeout=30)
+        finally:
+            self.counters.enabled = False
+        after = self.counters.snapshot()
+        sample = {"page": self.page(), "action": action, "wall_ms": round(wall * 1000, 3)}
+        sample.update({k: after[k] - before[k] for k in Counters.FIELDS})
+        errors = [str(e.value) for e in self.at.exception]
+        if errors:
+            sample["errors"] = errors
+        self.samples.append(sample)
+        if errors:
+            raise StepFailed(errors[0])
+
+    def widget(self, kind: str, label: str):
+        for w in getattr(self.at, kind):
+            if w.label == label:
+                return w
+        raise StepFailed(f"no {kind} labelled {label!r} on page {self.page()}")
+
+    def click(self, label: str, action: str = None):
+        self.step(action or f"click:{label}", self.widget("button", label).click)
+
+    def set_slice(self, key: str, index: int):
+        def prepare():
+            self.at.session_state[key] = index
+        self.step("slice", prepare)
+
+
+def run_scenario(s: Session, user: str, password: str, n_cases: int, n_slices: int):
+    s.step("load")
+    s.widget("text_input", "Username").set_value(user)
+    s.widget("text_input", "Password").set_value(password)
+    s.click("Login", "login")
+
+    s.click("Standard Eval", "open")
+    for _ in range(n_cases):
+        for i in range(1, n_slices):
+            s.set_slice("current_slice_standard", i)
+        s.step("select_organ", lambda: s.widget("selectbox", "Organ").set_value("LIVER"))
+        s.click("Add Corr", "add_correction")
+        s.click("Submit & Next", "submit")
+    s.click("Save & Back", "back")
+
+    s.click("Turing Test", "open")
+    for _ in range(n_cases):
+        s.click("Submit Initial", "submit_initial")
+        for i in range(1, n_slices):
+            s.set_slice("current_slice_turing", i)
+        s.click("Finalize & Next", "submit")
+    s.click("Save & Back", "back")
+
+    s.click("AI Report Edit", "open")
+    for _ in range(n_cases):
+        for i in range(1, n_slices):
+            s.set_slice("current_slice_ai", i)
+        s.click("Submit & Next", "submit")
+    s.click("Save & Back", "back")
+
+    s.click("View All Results", "open")
+    s.step("rerun")
+    s.click("Home", "back")
+
+
+def worker(app: str, args) -> dict:
+    """Runs inside the subprocess, with the scratch copy as working directory."""
+    sys.path.insert(0, os.getcwd())
+    counters = Counters()
+    counters.install()
+    s = Session(os.path.join(os.getcwd(), app), counters)
+    error = None
+    try:
+        run_scenario(s, args.user, args.password, args.cases, args.slices)
+    except StepFailed as e:
+        error = str(e)
+    return {"app": app, "samples": s.samples, "error": error}
+
+
+# --------------------------------------------------
+# Driver
+# --------------------------------------------------
+def make_workdir(n_cases: int) -> str:
+    """Scratch copy of the code, config and the first n_cases image folders."""
+    work = tempfile.mkdtemp(prefix="cpta-bench-")
+    for name in os.listdir(HERE):
+        if name in COPY_SKIP or name.startswith("."):
+            continue
+        src = os.path.join(HERE, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, os.path.join(work, name), ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            shutil.copy2(src, work)
+    src_images = os.path.join(HERE, IMAGE_DIR)
+    os.makedirs(os.path.join(work, IMAGE_DIR))
+    case_ids = sorted(e.name for e in os.scandir(src_images) if e.is_dir())
+    for case_id in case_ids[:n_cases]:
+        shutil.copytree(os.path.join(src_images, case_id), os.path.join(work, IMAGE_DIR, case_id))
+    return work
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples) -> dict:
+    """Per page (and overall): rerun count, p50/p95/max wall time, mean counters."""
+    groups = {"(all)": samples}
+    for sample in samples:
+        groups.setdefault(sample["page"], []).append(sample)
+    summary = {}
+    for page, group in groups.items():
+        walls = [s["wall_ms"] for s in group]
+        summary[page] = {
+            "reruns": len(group),
+            "p50_ms": round(percentile(walls, 50), 3),
+            "p95_ms": round(percentile(walls, 95), 3),
+            "max_ms": round(max(walls), 3),
+            **{f"mean_{k}": round(sum(s[k] for s in group) / len(group), 2) for k in Counters.FIELDS},
+        }
+    return summary
+
+
+def run_app(app: str, args) -> dict:
+    # One spare case so "Submit & Next" on the last walked case lands on a case page
+    work = make_workdir(args.cases + 1)
+    try:
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", app,
+               "--cases", str(args.cases), "--slices", str(args.slices),
+               "--user", args.user, "--password", args.password]
+        proc = subprocess.run(cmd, cwd=work, capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            return {"app": app, "samples": [], "error": proc.stderr.strip().splitlines()[-1:] or "worker failed"}
+        return json.loads(lines[-1])
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_summary(result: dict):
+    print(f"\n{result['app']}" + (f"  (stopped: {result['error']})" if result.get("error") else ""))
+    header = f"{'page':<16}{'reruns':>7}{'p50 ms':>10}{'p95 ms':>10}{'opens':>8}{'lists':>7}{'queries':>9}{'rchar':>11}"
+    print(header)
+    for page, s in result["summary"].items():
+        print(f"{page:<16}{s['reruns']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+              f"{s['mean_opens']:>8.1f}{s['mean_listdirs']:>7.1f}{s['mean_queries']:>9.1f}{s['mean_rchar']:>11.0f}")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--apps", nargs="+", default=["app.py", "app1.py"])
+    p.add_argument("--cases", type=int, default=3, help="cases to walk through per workflow")
+    p.add_argument("--slices", type=int, default=10, help="slices to page through per case")
+    p.add_argument("--user", default="TuringTest")
+    p.add_argument("--password", default="abc")
+    p.add_argument("--json", help="write full results here")
+    p.add_argument("--keep", action="store_true", help="keep the scratch directories")
+    p.add_argument("--worker", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args)))
+        return
+
+    report = {"revision": git_revision(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "cases": args.cases, "slices": args.slices, "apps": {}}
+    for app in args.apps:
+        result = run_app(app, args)
+        result["summary"] = summarize(result["samples"]) if result["samples"] else {}
+        report["apps"][app] = result
+        print_summary(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
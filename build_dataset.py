@@ -0,0 +1,479 @@
+"""
+Incremental build of 2D_Image_clean from the raw 2D_Image tree.
+
+2D_Image_clean was produced by hand from 2D_Image and nothing in the repo
+reproduced it, so adding studies meant regenerating the tree outside the
+project.  This derives it with a process pool and keeps a build state in
+2D_Image_clean/.build.json: the size, mtime and SHA-1 of every source file
+and the stat of the output written for it.  A rerun only hashes files whose
+stat changed and only rebuilds slices whose content (or cleaner) changed or
+whose output went missing; sources that disappeared take their outputs
+with them.  The case manifest (.cache/manifest-*.json) is rebuilt at the
+end, so the apps pick up new cases without a scan of their own.
+
+Slices go through a cleaner from CLEANERS:
+
+    corners  burned-in scanner text in the top corners blacked out (set to
+             0), re-encoded as RGB, the format the apps read
+    rgb      RGB re-encode only; a baseline for --verify, not for builds
+
+The tool that produced the shipped 2D_Image_clean is not part of the repo.
+It scrubbed text all over the margins, apparently by recognising it, and
+kept much of it; only the top-corner settings text is removed consistently.
+`corners` blanks bright pixels under corner_mask.png: the top-corner
+positions where the shipped tree removed text in at least half of the
+slices that show text there.  --learn-mask derives it from the existing
+2D_Image -> 2D_Image_clean pairs and --verify scores a cleaner against
+them.  The outcome is recorded in the build state under "validated",
+keyed by cleaner id (name, version and mask digest), and the build
+refuses a cleaner whose current id has not passed, i.e. beaten rgb, there;
+a new version or mask needs --verify again.
+
+Outputs that already exist when the build first sees their source are
+adopted as they are rather than regenerated; --force rebuilds them.
+text.txt is copied from the source; pred.txt is model output maintained in
+2D_Image_clean and is only copied when the case has none.
+
+    python build_dataset.py [--src 2D_Image] [--dst 2D_Image_clean]
+                            [--cleaner corners] [--workers N] [--force] [--dry-run]
+    python build_dataset.py --verify [--cleaner corners] [--sample 4]
+    python build_dataset.py --learn-mask
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+from manifest import IMAGE_EXTS, build_manifest, manifest_path
+from slice_cache import file_digest
+
+SRC_DIR = "2D_Image"
+DST_DIR = "2D_Image_clean"
+STATE_NAME = ".build.json"
+STATE_VERSION = 1
+JPEG_QUALITY = 95
+COPY_REPORTS = ("text.txt",)           # always follow the source
+SEED_REPORTS = ("pred.txt",)           # copied only when the output has none
+
+CORNER_MASK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corner_mask.png")
+CORNER_MIN = 40         # grey level blanked under the mask (text and its anti-aliasing)
+CORNER_TOP = 0.26       # corner boxes, as fractions of height and width
+CORNER_LEFT = 0.11
+CORNER_RIGHT = 0.935
+MASK_TEXT = 100         # grey level counted as text when learning the mask
+MASK_REMOVED = 30       # ... and as removed in the clean slice
+MASK_SHARE = 0.5        # share of slices with text at a pixel that must have it removed
+MASK_MIN_SEEN = 20      # slices with text at a pixel before it counts
+DIFF = 30               # --verify: grey levels apart that count as different
+
+
+# --------------------------------------------------
+# Cleaners: PIL image in, PIL image out (pure, run in worker processes)
+# --------------------------------------------------
+def clean_rgb(img):
+    return img.convert("RGB")
+
+
+_corner_masks = {}      # image size -> boolean mask, per worker process
+
+
+def corner_mask(size):
+    mask = _corner_masks.get(size)
+    if mask is None:
+        import numpy as np
+        from PIL import Image
+
+        if not os.path.exists(CORNER_MASK):
+            raise FileNotFoundError(f"{CORNER_MASK} is missing; run python build_dataset.py --learn-mask")
+        with Image.open(CORNER_MASK) as m:
+            mask = _corner_masks[size] = np.asarray(m.convert("L").resize(size, Image.NEAREST)) > 0
+    return mask
+
+
+def clean_corners(img):
+    import numpy as np
+    from PIL import Image
+
+    g = np.array(img.convert("L"))
+    g[corner_mask(img.size) & (g >= CORNER_MIN)] = 0
+    return Image.fromarray(g).convert("RGB")
+
+
+# name -> (function, version); bump the version when a cleaner's output
+# changes, which also means running --verify again
+CLEANERS = {
+    "corners": (clean_corners, 1),
+    "rgb":     (clean_rgb, 1),
+}
+DEFAULT_CLEANER = "corners"
+
+
+def cleaner_id(name: str) -> str:
+    # The mask is part of the corners cleaner: a new mask rebuilds its outputs
+    if name == "corners" and os.path.exists(CORNER_MASK):
+        return f"{name}/{CLEANERS[name][1]}+{file_digest(CORNER_MASK)[:8]}"
+    return f"{name}/{CLEANERS[name][1]}"
+
+
+def require_validated(name: str, dst_dir: str = DST_DIR):
+    """Raise ValueError unless --verify passed for this cleaner's current id against dst_dir."""
+    if name not in CLEANERS:
+        raise ValueError(f"unknown cleaner: {name}")
+    current = cleaner_id(name)
+    result = load_state(dst_dir).get("validated", {}).get(current)
+    if not result or not result.get("passed"):
+        why = "failed" if result else "has not been run"
+        raise ValueError(f"cleaner {current} is not validated: --verify against {dst_dir} {why}; "
+                         f"run python build_dataset.py --verify --cleaner {name} --dst {dst_dir}")
+
+
+def _clean_one(job):
+    """Worker: clean src into dst atomically; returns (rel, output stat)."""
+    from PIL import Image
+
+    rel, src, dst, cleaner = job
+    with Image.open(src) as img:
+        out = CLEANERS[cleaner][0](img)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    out.save(tmp, "JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp, dst)
+    return rel, _stat(dst)
+
+
+# --------------------------------------------------
+# Build state
+# --------------------------------------------------
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_state(dst_dir: str) -> dict:
+    try:
+        with open(os.path.join(dst_dir, STATE_NAME), "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    if state.get("version") != STATE_VERSION:
+        state = {"version": STATE_VERSION, "files": {}}
+    return state
+
+
+def save_state(dst_dir: str, state: dict):
+    os.makedirs(dst_dir, exist_ok=True)
+    path = os.path.join(dst_dir, STATE_NAME)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def source_files(src_dir: str) -> dict:
+    """'case/name' -> path for every slice and report under src_dir."""
+    files = {}
+    with os.scandir(src_dir) as cases:
+        case_ids = sorted(e.name for e in cases if e.is_dir())
+    for case_id in case_ids:
+        with os.scandir(os.path.join(src_dir, case_id)) as entries:
+            for e in entries:
+                if e.is_file() and (e.name.lower().endswith(IMAGE_EXTS)
+                                    or e.name in COPY_REPORTS + SEED_REPORTS):
+                    files[f"{case_id}/{e.name}"] = e.path
+    return files
+
+
+def _source_entry(old, path: str) -> dict:
+    """Stat and digest of a source file; the digest is reused while the stat matches."""
+    stat = _stat(path)
+    if old and old.get("src") == stat:
+        return {"src": stat, "sha1": old["sha1"]}
+    return {"src": stat, "sha1": file_digest(path)}
+
+
+# --------------------------------------------------
+# Planning and building
+# --------------------------------------------------
+def plan(src_dir: str, dst_dir: str, cleaner: str, force: bool = False):
+    """
+    Compare the source tree with the build state.  Returns (state, work)
+    where work has "clean", "copy", "seed", "adopt" and "remove" lists of
+    relative paths and "hashes" with the fresh source entries.
+    """
+    state = load_state(dst_dir)
+    old_files = state["files"]
+    current = cleaner_id(cleaner)
+    work = {"clean": [], "copy": [], "seed": [], "adopt": [], "remove": [], "hashes": {}}
+    sources = source_files(src_dir)
+    for rel, path in sources.items():
+        old = old_files.get(rel)
+        entry = _source_entry(old, path)
+        work["hashes"][rel] = entry
+        name = rel.rsplit("/", 1)[1]
+        out_stat = _stat(os.path.join(dst_dir, rel))
+        if name in SEED_REPORTS:
+            if out_stat is None:
+                work["seed"].append(rel)
+            elif old is None:
+                work["adopt"].append(rel)
+            continue
+        if old is None and out_stat is not None and not force:
+            work["adopt"].append(rel)
+            continue
+        unchanged = (old is not None and old["sha1"] == entry["sha1"]
+                     and out_stat is not None and old.get("out") == out_stat)
+        if name in COPY_REPORTS:
+            if force or not unchanged:
+                work["copy"].append(rel)
+        elif force or not unchanged or old.get("cleaner") not in (current, None):
+            work["clean"].append(rel)
+    # Seeded reports are maintained in the output, so they only go with their case
+    live_cases = {rel.split("/", 1)[0] for rel in sources}
+    work["remove"] = sorted(
+        rel for rel, old in old_files.items()
+        if rel not in sources and old.get("out") is not None
+        and not (old.get("seeded") and rel.split("/", 1)[0] in live_cases)
+    )
+    return state, work
+
+
+def _entry(source: dict, rel: str, out_stat, cleaner: str = None) -> dict:
+    entry = {**source, "out": out_stat, "cleaner": cleaner}
+    if rel.rsplit("/", 1)[1] in SEED_REPORTS:
+        entry["seeded"] = True
+    return entry
+
+
+def changed_cases(work: dict) -> list:
+    return sorted({rel.split("/", 1)[0] for key in ("clean", "copy", "seed", "remove") for rel in work[key]})
+
+
+def build(src_dir: str = SRC_DIR, dst_dir: str = DST_DIR, cleaner: str = DEFAULT_CLEANER,
+          workers: int = None, force: bool = False) -> dict:
+    """Bring dst_dir up to date with src_dir; returns counts and timings."""
+    require_validated(cleaner, dst_dir)
+    t0 = time.perf_counter()
+    state, work = plan(src_dir, dst_dir, cleaner, force)
+    files = state["files"]
+    current = cleaner_id(cleaner)
+    hashes = work["hashes"]
+    try:
+        for rel in work["adopt"]:
+            files[rel] = _entry(hashes[rel], rel, _stat(os.path.join(dst_dir, rel)))
+        for rel in work["copy"] + work["seed"]:
+            dst = os.path.join(dst_dir, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            tmp = f"{dst}.{os.getpid()}.tmp"
+            shutil.copyfile(os.path.join(src_dir, rel), tmp)
+            os.replace(tmp, dst)
+            files[rel] = _entry(hashes[rel], rel, _stat(dst))
+        if work["clean"]:
+            from concurrent.futures import ProcessPoolExecutor   # build-time only
+
+            jobs = [(rel, os.path.join(src_dir, rel), os.path.join(dst_dir, rel), cleaner)
+                    for rel in work["clean"]]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for rel, out_stat in pool.map(_clean_one, jobs, chunksize=8):
+                    files[rel] = _entry(hashes[rel], rel, out_stat, current)
+        for rel in work["remove"]:
+            path = os.path.join(dst_dir, rel)
+            if os.path.exists(path):
+                os.remove(path)
+            files.pop(rel, None)
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass    # other files left in the case folder
+        # Unchanged sources may still have a new stat (touched, re-copied)
+        for rel, entry in hashes.items():
+            if rel in files:
+                files[rel].update(entry)
+    finally:
+        # Whatever finished is recorded, so an interrupted build resumes
+        save_state(dst_dir, state)
+    manifest = build_manifest(dst_dir)
+    return {
+        "cases": len(manifest),
+        "changed_cases": len(changed_cases(work)),
+        **{key: len(work[key]) for key in ("clean", "copy", "seed", "adopt", "remove")},
+        "manifest": manifest_path(dst_dir),
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+# --------------------------------------------------
+# Checking cleaners against the shipped tree
+# --------------------------------------------------
+def slice_pairs(src_dir: str, dst_dir: str, sample: int = 1) -> list:
+    """(source, shipped clean) paths for every sample-th slice present in both trees."""
+    pairs = [
+        (path, os.path.join(dst_dir, rel))
+        for rel, path in source_files(src_dir).items()
+        if rel.lower().endswith(IMAGE_EXTS) and os.path.exists(os.path.join(dst_dir, rel))
+    ]
+    return pairs[::max(1, sample)]
+
+
+def _verify_one(job):
+    """Worker: counts comparing cleaner output and the rgb baseline with one shipped slice."""
+    import numpy as np
+    from PIL import Image
+
+    src, dst, cleaner = job
+    with Image.open(src) as img:
+        out = np.asarray(CLEANERS[cleaner][0](img).convert("L"), dtype=np.int16)
+        raw = np.asarray(img.convert("L"), dtype=np.int16)
+    with Image.open(dst) as img:
+        ref = np.asarray(img.convert("L"), dtype=np.int16)
+    if ref.shape != raw.shape:
+        return None
+    target = np.abs(raw - ref) > DIFF       # what the shipped cleaning changed
+    wrong = np.abs(out - ref) > DIFF
+    return {
+        "target": int(target.sum()),
+        "removed": int((target & ~wrong).sum()),
+        "collateral": int((~target & wrong).sum()),
+        "error": float(np.abs(out - ref).mean()),
+        "baseline_error": float(np.abs(raw - ref).mean()),
+    }
+
+
+def verify(src_dir: str = SRC_DIR, dst_dir: str = DST_DIR, cleaner: str = DEFAULT_CLEANER,
+           sample: int = 1, workers: int = None) -> dict:
+    """
+    Score a cleaner on the existing pairs: the share of the shipped tree's
+    changes it reproduces, pixels it changes that the shipped tree kept, and
+    its mean absolute error next to the rgb baseline's.  "passed" when it
+    beats the baseline.  The result is recorded in dst_dir's build state
+    for require_validated.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = [(src, dst, cleaner) for src, dst in slice_pairs(src_dir, dst_dir, sample)]
+    totals = {"slices": 0, "target": 0, "removed": 0, "collateral": 0, "error": 0.0, "baseline_error": 0.0}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for r in pool.map(_verify_one, jobs, chunksize=8):
+            if r is None:
+                continue
+            totals["slices"] += 1
+            for key, value in r.items():
+                totals[key] += value
+    n = max(totals["slices"], 1)
+    result = {
+        "cleaner": cleaner,
+        "slices": totals["slices"],
+        "removed_share": round(totals["removed"] / max(totals["target"], 1), 3),
+        "collateral_per_slice": round(totals["collateral"] / n, 1),
+        "error": round(totals["error"] / n, 3),
+        "baseline_error": round(totals["baseline_error"] / n, 3),
+        "passed": totals["slices"] > 0 and totals["error"] < totals["baseline_error"],
+        "sample": sample,
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    state = load_state(dst_dir)
+    state.setdefault("validated", {})[cleaner_id(cleaner)] = result
+    save_state(dst_dir, state)
+    return result
+
+
+def _mask_counts(job):
+    """Worker: per-pixel counts of text, and of text removed, over one case's pairs."""
+    import numpy as np
+    from PIL import Image
+
+    pairs, size = job
+    seen = removed = None
+    for src, dst in pairs:
+        with Image.open(src) as a, Image.open(dst) as b:
+            if a.size != size or b.size != size:
+                continue
+            raw = np.asarray(a.convert("L"))
+            ref = np.asarray(b.convert("L"))
+        text = raw >= MASK_TEXT
+        if seen is None:
+            seen = np.zeros(text.shape, np.int32)
+            removed = np.zeros(text.shape, np.int32)
+        seen += text
+        removed += text & (ref <= MASK_REMOVED)
+    return seen, removed
+
+
+def learn_mask(src_dir: str = SRC_DIR, dst_dir: str = DST_DIR, out_path: str = CORNER_MASK,
+               workers: int = None) -> dict:
+    """Derive corner_mask.png from the pairs at the most common slice size."""
+    from collections import Counter
+    from concurrent.futures import ProcessPoolExecutor
+
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    pairs = slice_pairs(src_dir, dst_dir)
+    sizes = Counter()
+    for src, _ in pairs[::16]:
+        with Image.open(src) as img:
+            sizes[img.size] += 1
+    size = sizes.most_common(1)[0][0]
+    by_case = {}
+    for src, dst in pairs:
+        by_case.setdefault(os.path.basename(os.path.dirname(src)), []).append((src, dst))
+    seen = removed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for s, r in pool.map(_mask_counts, [(p, size) for p in by_case.values()]):
+            if s is not None:
+                seen, removed = seen + s, removed + r
+    share = np.where(seen >= MASK_MIN_SEEN, removed / np.maximum(seen, 1), 0)
+    mask = share >= MASK_SHARE
+    h, w = mask.shape
+    corners = np.zeros_like(mask)
+    corners[:int(CORNER_TOP * h), :int(CORNER_LEFT * w)] = True
+    corners[:int(CORNER_TOP * h), int(CORNER_RIGHT * w):] = True
+    mask &= corners
+    # Cover the glyphs' anti-aliased edges
+    img = Image.fromarray(mask.astype(np.uint8) * 255).filter(ImageFilter.MaxFilter(3))
+    img = Image.fromarray((np.asarray(img) > 0) & corners)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    img.save(tmp, "PNG")
+    os.replace(tmp, out_path)
+    return {"slices": len(pairs), "size": size, "pixels": int(np.asarray(img).sum()), "mask": out_path}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Build 2D_Image_clean from 2D_Image incrementally.")
+    p.add_argument("--src", default=SRC_DIR)
+    p.add_argument("--dst", default=DST_DIR)
+    p.add_argument("--cleaner", choices=sorted(CLEANERS), default=DEFAULT_CLEANER)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--force", action="store_true", help="rebuild everything, including adopted outputs")
+    p.add_argument("--dry-run", action="store_true", help="list what would change and exit")
+    p.add_argument("--verify", action="store_true", help="score the cleaner against the existing pairs and exit")
+    p.add_argument("--sample", type=int, default=1, help="--verify: every Nth slice")
+    p.add_argument("--learn-mask", action="store_true", help=f"derive {os.path.basename(CORNER_MASK)} and exit")
+    args = p.parse_args()
+    if args.learn_mask:
+        r = learn_mask(args.src, args.dst, workers=args.workers)
+        print(f"{r['mask']}: {r['pixels']} pixels at {r['size'][0]}x{r['size'][1]} from {r['slices']} slices")
+    elif args.verify:
+        r = verify(args.src, args.dst, args.cleaner, args.sample, args.workers)
+        print(f"{r['cleaner']} on {r['slices']} slices: {r['removed_share']:.1%} of the shipped changes, "
+              f"{r['collateral_per_slice']:.0f} other pixels changed per slice, mean error "
+              f"{r['error']:.3f} (rgb {r['baseline_error']:.3f}): {'passed' if r['passed'] else 'FAILED'}")
+        sys.exit(0 if r["passed"] else 1)
+    elif args.dry_run:
+        _, work = plan(args.src, args.dst, args.cleaner, args.force)
+        for key in ("clean", "copy", "seed", "adopt", "remove"):
+            print(f"{key:<8}{len(work[key]):>7}")
+        for case_id in changed_cases(work):
+            print(f"  {case_id}")
+    else:
+        try:
+            r = build(args.src, args.dst, args.cleaner, args.workers, args.force)
+        except (ValueError, FileNotFoundError) as e:
+            sys.exit(f"build_dataset: {e}")
+        print(f"{r['cases']} cases ({r['changed_cases']} changed): {r['clean']} slices cleaned, "
+              f"{r['copy'] + r['seed']} reports copied, {r['adopt']} adopted, {r['remove']} removed "
+              f"in {r['seconds']:.1f}s; manifest {r['manifest']}")
@@ -0,0 +1,102 @@
+"""
+Hashed-credential cache for config.yaml.
+
+bcrypt is slow on purpose, so hashing every plain-text password in
+config.yaml on each Streamlit rerun made login and every slice click pay
+one bcrypt round per annotator account.  The hashes are now computed once
+per distinct config.yaml content, kept in memory for the server process
+and persisted under .cache/ so restarts and new sessions reuse them.
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+
+CACHE_DIR = ".cache"
+CACHE_PREFIX = "credentials-"
+
+_lock = threading.Lock()
+_configs = {}   # content digest -> parsed config with hashed passwords
+_stats = {}     # path -> ((mtime_ns, size), digest) of the last read
+
+
+def _cache_path(digest: str) -> str:
+    return os.path.join(CACHE_DIR, f"{CACHE_PREFIX}{digest}.json")
+
+
+def _read_cached_hashes(digest: str) -> dict:
+    try:
+        with open(_cache_path(digest), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cached_hashes(digest: str, hashes: dict):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Drop hashes computed for older versions of config.yaml
+    for fname in os.listdir(CACHE_DIR):
+        if fname.startswith(CACHE_PREFIX) and fname != os.path.basename(_cache_path(digest)):
+            try:
+                os.remove(os.path.join(CACHE_DIR, fname))
+            except OSError:
+                pass
+    tmp = _cache_path(digest) + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(hashes, f)
+    os.replace(tmp, _cache_path(digest))
+
+
+def hash_credentials(credentials: dict, digest: str) -> dict:
+    """
+    Replace plain-text passwords with bcrypt hashes, reusing the hashes
+    persisted for this config digest and hashing only what is missing.
+    """
+    from streamlit_authenticator.utilities.hasher import Hasher
+
+    cached = _read_cached_hashes(digest)
+    hashes = {}
+    for uname, user in credentials["usernames"].items():
+        password = str(user["password"])
+        if not Hasher.is_hash(password):
+            password = cached.get(uname) or Hasher.hash(password)
+        user["password"] = password
+        hashes[uname] = password
+    if hashes != cached:
+        _write_cached_hashes(digest, hashes)
+    return credentials
+
+
+def load_config(path: str = "config.yaml") -> dict:
+    """
+    Parse config.yaml with its passwords already hashed.
+
+    Edits are picked up: the file is stat'ed on every call and re-read when
+    its mtime or size changes, but parsing and hashing only happen when its
+    content hash changes.  Each caller gets its own copy because the
+    authenticator mutates the credentials dict.
+    """
+    st = os.stat(path)
+    sig = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        seen = _stats.get(path)
+        if seen is not None and seen[0] == sig and seen[1] in _configs:
+            return copy.deepcopy(_configs[seen[1]])
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    with _lock:
+        config = _configs.get(digest)
+        if config is None:
+            import yaml   # only needed when the content changed
+
+            config = yaml.load(raw, Loader=yaml.SafeLoader) or {}
+            creds = config.get("credentials")
+            if isinstance(creds, dict) and "usernames" in creds:
+                hash_credentials(creds, digest)
+            _configs.clear()
+            _configs[digest] = config
+        _stats[path] = (sig, digest)
+    return copy.deepcopy(config)
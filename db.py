@@ -0,0 +1,143 @@
+"""
+Process-wide SQLite connection pool.
+
+Every Streamlit session runs its script in its own thread, and the apps
+used to open (and close) a fresh sqlite3 connection for each small query.
+Connections are now opened once per database file, configured for WAL
+journaling, and handed out to whichever script thread needs one.
+
+    with db.connection(DB_PATH) as conn:      # reads
+        row = conn.execute("SELECT ...").fetchone()
+
+    with db.transaction(DB_PATH) as conn:     # writes, committed on exit
+        conn.execute("INSERT ...")
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers never block the single writer
+    "PRAGMA synchronous=NORMAL",      # fsync at checkpoints only; safe with WAL
+    "PRAGMA cache_size=-8192",        # 8 MiB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of connections to one database file."""
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _open(self) -> sqlite3.Connection:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            # More threads than pool slots were busy at once; drop the extra
+            with self._lock:
+                if conn in self._all:
+                    self._all.remove(conn)
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str) -> ConnectionPool:
+    key = os.path.abspath(path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key)
+    return pool
+
+
+def connection(path: str):
+    """Borrow a pooled connection; any open transaction is rolled back on return."""
+    return get_pool(path).connection()
+
+
+def transaction(path: str):
+    """Borrow a pooled connection and commit on success, roll back on error."""
+    return get_pool(path).transaction()
+
+
+@atexit.register
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
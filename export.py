@@ -0,0 +1,378 @@
+"""
+Streaming export of study results to Parquet and CSV.
+
+Getting the results out meant paging through the explorer or copying
+logs.db and unpacking progress_json by hand.  This streams progress_logs,
+one category at a time in id order, and the annotations (the annotation
+log plus the rows of the old SQLite annotations table) in chunks of
+CHUNK rows.  Each chunk's JSON is flattened into typed columns and
+appended to the open Parquet and CSV writers before the next chunk is
+read, so memory stays at one chunk whatever the size of the study.
+
+Per-category columns are listed in PROGRESS_FIELDS.  ai_is_a is the row's
+own assignment (from a delta, or from the whole map of a full-snapshot
+row); corrections are kept as a JSON string next to their count, and
+annotations.* has one row per correction.  --raw adds the untouched
+progress_json.
+
+Each SQLite category is read by a single statement, which in WAL mode sees
+one snapshot: rows committed while the export runs are left for the next
+one.  Files are written under a temporary name and renamed when complete.
+
+    python export.py [--db logs/logs.db] [--store evaluations] [--out exports]
+                     [--format parquet csv] [--chunk 5000] [--raw]
+"""
+import argparse
+import json
+import os
+import time
+
+import db
+
+CHUNK = 5000
+EXPORT_DIR = "exports"
+FORMATS = ("parquet", "csv")
+DOWNLOAD_MAX_BYTES = 200 << 20     # larger files are listed, not offered for download
+
+
+def _key(name):
+    return lambda p: p.get(name)
+
+
+def _ai_is_a(p):
+    if "assignment" in p:       # per-case delta (progress_delta)
+        return p["assignment"]
+    assignments = p.get("assignments")
+    if isinstance(assignments, dict):
+        return assignments.get(p.get("case_id"))
+    return None
+
+
+def _changed(p):
+    initial, final = p.get("initial_eval"), p.get("final_eval")
+    return None if initial is None or final is None else initial != final
+
+
+def _n_corrections(p):
+    corrections = p.get("corrections")
+    return len(corrections) if isinstance(corrections, list) else None
+
+
+def _corrections(p):
+    corrections = p.get("corrections")
+    return None if corrections is None else json.dumps(corrections, ensure_ascii=False)
+
+
+# category -> [(column, type, extractor(progress dict))], after id/session_id/timestamp
+PROGRESS_FIELDS = {
+    "turing_test": [
+        ("case_id",       "string", _key("case_id")),
+        ("last_case",     "int64",  _key("last_case")),
+        ("ai_is_a",       "bool",   _ai_is_a),
+        ("initial_eval",  "string", _key("initial_eval")),
+        ("final_eval",    "string", _key("final_eval")),
+        ("changed",       "bool",   _changed),
+        ("viewed_images", "bool",   _key("viewed_images")),
+    ],
+    "standard_evaluation": [
+        ("case_id",       "string", _key("case_id")),
+        ("last_case",     "int64",  _key("last_case")),
+        ("ai_is_a",       "bool",   _ai_is_a),
+        ("n_corrections", "int32",  _n_corrections),
+        ("corrections",   "string", _corrections),
+    ],
+    "ai_edit": [
+        ("case_id",       "string", _key("case_id")),
+        ("mode",          "string", _key("mode")),
+        ("assembled",     "string", _key("assembled")),
+        ("n_corrections", "int32",  _n_corrections),
+        ("corrections",   "string", _corrections),
+    ],
+}
+# Categories nobody declared columns for still get the promoted ones
+GENERIC_FIELDS = [
+    ("case_id",   "string", _key("case_id")),
+    ("last_case", "int64",  _key("last_case")),
+]
+
+ANNOTATION_FIELDS = [
+    ("source",   "string"),    # "log" (annotation_store) or "sqlite" (old annotations table)
+    ("entry",    "int64"),     # log line number or table id
+    ("case_id",  "string"),
+    ("item",     "int32"),     # position within the submission
+    ("organ",    "string"),
+    ("reason",   "string"),
+    ("details",  "string"),
+    ("timestamp", "timestamp_ms"),
+]
+
+
+# --------------------------------------------------
+# Typed batches
+# --------------------------------------------------
+def _arrow_type(name: str):
+    import pyarrow as pa
+
+    return {
+        "string": pa.string(), "int64": pa.int64(), "int32": pa.int32(), "bool": pa.bool_(),
+        "timestamp": pa.timestamp("s", tz="UTC"),        # SQLite CURRENT_TIMESTAMP text
+        "timestamp_ms": pa.timestamp("ms", tz="UTC"),    # epoch milliseconds
+    }[name]
+
+
+def _coerce(value, type_name: str):
+    """Best-effort cast of a JSON value; anything unusable becomes null."""
+    if value is None:
+        return None
+    try:
+        if type_name in ("int64", "int32"):
+            return int(value)
+        if type_name == "bool":
+            return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+        if type_name == "string":
+            return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def _schema(fields):
+    import pyarrow as pa
+
+    return pa.schema([(name, _arrow_type(type_name)) for name, type_name in fields])
+
+
+def _batch(schema, columns: dict):
+    """RecordBatch from column lists; SQLite timestamps are parsed as UTC."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_timestamp(field.type) and field.type.unit == "s":
+            parsed = pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d %H:%M:%S",
+                                 unit="s", error_is_null=True)
+            arrays.append(parsed.cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# --------------------------------------------------
+# Writers: one per output file, fed batch by batch
+# --------------------------------------------------
+class _TableWriter:
+    """Parquet and/or CSV files for one table, written to .tmp names until close()."""
+
+    def __init__(self, base: str, schema, formats):
+        import pyarrow.csv as pcsv
+        import pyarrow.parquet as pq
+
+        self.schema = schema
+        self.rows = 0
+        self.paths = {fmt: f"{base}.{fmt}" for fmt in formats}
+        self._writers = {}
+        for fmt, path in self.paths.items():
+            tmp = path + ".tmp"
+            if fmt == "parquet":
+                self._writers[fmt] = pq.ParquetWriter(tmp, schema, compression="zstd")
+            else:
+                self._writers[fmt] = pcsv.CSVWriter(tmp, schema)
+
+    def write(self, batch):
+        if batch.num_rows:
+            for w in self._writers.values():
+                w.write_batch(batch)
+            self.rows += batch.num_rows
+
+    def close(self, ok: bool = True) -> dict:
+        for fmt, w in self._writers.items():
+            w.close()
+            if ok:
+                os.replace(self.paths[fmt] + ".tmp", self.paths[fmt])
+            else:
+                os.remove(self.paths[fmt] + ".tmp")
+        return {"rows": self.rows, "files": list(self.paths.values())}
+
+
+def _write_stream(base: str, fields, rows, formats, chunk: int) -> dict:
+    """Drain an iterator of row tuples (in fields order) into one table's files."""
+    schema = _schema(fields)
+    writer = _TableWriter(base, schema, formats)
+    names = [name for name, _ in fields]
+    ok = False
+    try:
+        columns = {name: [] for name in names}
+        pending = 0
+        for row in rows:
+            for name, value in zip(names, row):
+                columns[name].append(value)
+            pending += 1
+            if pending >= chunk:
+                writer.write(_batch(schema, columns))
+                columns = {name: [] for name in names}
+                pending = 0
+        writer.write(_batch(schema, columns))
+        ok = True
+    finally:
+        result = writer.close(ok)
+    return result
+
+
+# --------------------------------------------------
+# Row sources
+# --------------------------------------------------
+def _progress_rows(conn, category: str, fields, raw: bool, chunk: int):
+    cur = conn.execute(
+        "SELECT id, session_id, timestamp, progress_json FROM progress_logs "
+        "WHERE category=? ORDER BY id",
+        (category,),
+    )
+    while True:
+        rows = cur.fetchmany(chunk)
+        if not rows:
+            break
+        for row_id, session_id, timestamp, blob in rows:
+            try:
+                progress = json.loads(blob) if blob else {}
+            except ValueError:
+                progress = {}
+            if not isinstance(progress, dict):
+                progress = {}
+            out = [row_id, session_id, timestamp]
+            out.extend(_coerce(fn(progress), type_name) for _, type_name, fn in fields)
+            if raw:
+                out.append(blob)
+            yield out
+
+
+def _split_corrections(corrections):
+    if not isinstance(corrections, list):
+        return
+    for i, c in enumerate(corrections):
+        if not isinstance(c, dict):
+            c = {"details": c}
+        yield i, c
+
+
+def _annotation_rows(conn, store_dir: str, chunk: int):
+    from annotation_store import get_store
+
+    for line, entry in enumerate(get_store(store_dir).iter_entries()):
+        ts = entry.get("ts")
+        for i, c in _split_corrections(entry.get("annotations")):
+            yield ("log", line, entry.get("case_id") or c.get("case_id"), i,
+                   _coerce(c.get("organ"), "string"), _coerce(c.get("reason"), "string"),
+                   _coerce(c.get("details"), "string"),
+                   int(ts * 1000) if isinstance(ts, (int, float)) else None)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='annotations'").fetchone():
+        cur = conn.execute("SELECT id, case_id, annotations_json, timestamp FROM annotations ORDER BY id")
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            for row_id, case_id, blob, timestamp in rows:
+                try:
+                    corrections = json.loads(blob) if blob else []
+                except ValueError:
+                    corrections = []
+                parsed = time.strptime(timestamp, "%Y-%m-%d %H:%M:%S") if timestamp else None
+                for i, c in _split_corrections(corrections):
+                    yield ("sqlite", row_id, case_id or c.get("case_id"), i,
+                           _coerce(c.get("organ"), "string"), _coerce(c.get("reason"), "string"),
+                           _coerce(c.get("details"), "string"),
+                           _utc_ms(parsed) if parsed else None)
+
+
+def _utc_ms(struct) -> int:
+    import calendar
+
+    return calendar.timegm(struct) * 1000
+
+
+# --------------------------------------------------
+# Export
+# --------------------------------------------------
+def export_all(db_path: str = os.path.join("logs", "logs.db"), store_dir: str = "evaluations",
+               out_dir: str = None, formats=FORMATS, chunk: int = CHUNK, raw: bool = False) -> dict:
+    """
+    Write every table to out_dir (default exports/<timestamp>/).
+    Returns {table: {"rows", "files"}} plus "out_dir" and "seconds".
+    """
+    t0 = time.perf_counter()
+    out_dir = out_dir or os.path.join(EXPORT_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(out_dir, exist_ok=True)
+    tables = {}
+    with db.connection(db_path) as conn:
+        categories = [r[0] for r in conn.execute(
+            "SELECT DISTINCT category FROM progress_logs WHERE category IS NOT NULL ORDER BY category"
+        )]
+        for category in categories:
+            fields = PROGRESS_FIELDS.get(category, GENERIC_FIELDS)
+            columns = [("id", "int64"), ("session_id", "string"), ("timestamp", "timestamp")]
+            columns += [(name, type_name) for name, type_name, _ in fields]
+            if raw:
+                columns.append(("progress_json", "string"))
+            tables[category] = _write_stream(
+                os.path.join(out_dir, f"progress_{category}"), columns,
+                _progress_rows(conn, category, fields, raw, chunk), formats, chunk,
+            )
+        tables["annotations"] = _write_stream(
+            os.path.join(out_dir, "annotations"), ANNOTATION_FIELDS,
+            _annotation_rows(conn, store_dir, chunk), formats, chunk,
+        )
+    return {"out_dir": out_dir, "seconds": round(time.perf_counter() - t0, 3), "tables": tables}
+
+
+def _file_reader(path: str):
+    def read() -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def render_export(db_path: str, store_dir: str = "evaluations", flush=None):
+    """
+    Admin button on the results page; the last export stays listed across
+    reruns.  flush (the app's write queue flush) runs first so queued saves
+    are included.
+    """
+    import streamlit as st
+
+    st.subheader("Export")
+    if st.button("Export all results (Parquet + CSV)", key="_export_run"):
+        with st.spinner("Exporting…"):
+            if flush is not None:
+                flush(timeout=5)
+            st.session_state["_export_result"] = export_all(db_path, store_dir)
+    result = st.session_state.get("_export_result")
+    if not result:
+        return
+    st.caption(f"{result['out_dir']} — {result['seconds']:.1f}s")
+    for table, info in result["tables"].items():
+        for path in info["files"]:
+            if not os.path.exists(path):
+                continue
+            size = os.path.getsize(path)
+            c1, c2 = st.columns([3, 1])
+            c1.write(f"`{os.path.basename(path)}` — {info['rows']} rows, {size / 1024:.0f} KiB")
+            if size <= DOWNLOAD_MAX_BYTES:
+                # A callable is only read when the button is clicked, not on every rerun
+                c2.download_button("Download", _file_reader(path), file_name=os.path.basename(path),
+                                   key=f"_export_{path}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Export progress logs and annotations to Parquet/CSV.")
+    p.add_argument("--db", default=os.path.join("logs", "logs.db"))
+    p.add_argument("--store", default="evaluations", help="annotation store directory")
+    p.add_argument("--out", help=f"output directory (default {EXPORT_DIR}/<timestamp>)")
+    p.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS))
+    p.add_argument("--chunk", type=int, default=CHUNK, help="rows per fetch and per written batch")
+    p.add_argument("--raw", action="store_true", help="include progress_json")
+    args = p.parse_args()
+    result = export_all(args.db, args.store, args.out, args.format, args.chunk, args.raw)
+    for table, info in result["tables"].items():
+        print(f"{table:<22}{info['rows']:>10} rows  {' '.join(info['files'])}")
+    print(f"exported to {result['out_dir']} in {result['seconds']:.2f}s")
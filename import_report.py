@@ -0,0 +1,103 @@
+"""
+Import-time report for the app scripts.
+
+Runs a script's module-level import statements in a fresh interpreter under
+`python -X importtime` and lists what each top-level import costs.  By
+default the modules a running Streamlit server has already loaded are
+imported first and left out, so the total is what the script adds on its
+first run in a new server process; --cold counts everything, as on a boot.
+Modules imported inside functions (pandas for correction tables and the
+results page, PIL, pyarrow) only show up if a top-level import pulls them
+in, which is what this is for.
+
+    python import_report.py [app.py app1.py] [--cold] [--top 15] [--json out.json]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+SERVER_PRELUDE = "import streamlit.web.bootstrap, streamlit.runtime.scriptrunner, streamlit.components.v1"
+MARKER = "--- script imports ---"
+
+
+def top_level_imports(script: str) -> str:
+    """Source of the import statements in the script's module body."""
+    with open(script, "r", encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source, filename=script)
+    return "\n".join(
+        ast.get_source_segment(source, node)
+        for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def parse_importtime(stderr: str) -> list:
+    """(name, self_us, cumulative_us) for the top-level entries after MARKER."""
+    entries, started = [], False
+    for line in stderr.splitlines():
+        if line.strip() == MARKER:
+            started = True
+            continue
+        if not started or not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue   # header line
+        if name.startswith("  "):
+            continue   # nested; counted in its parent's cumulative time
+        entries.append((name.strip(), int(self_us), int(cumulative)))
+    return entries
+
+
+def measure(script: str, cold: bool = False) -> dict:
+    imports = top_level_imports(script)
+    code = "\n".join([
+        "" if cold else SERVER_PRELUDE,
+        "import sys, time",
+        f"sys.stderr.write({MARKER!r} + '\\n')",
+        "t0 = time.perf_counter()",
+        imports,
+        "print(time.perf_counter() - t0)",
+    ])
+    folder = os.path.dirname(os.path.abspath(script))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=folder, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    modules = parse_importtime(proc.stderr)
+    return {
+        "script": script,
+        "cold": cold,
+        "wall_ms": round(float(proc.stdout.strip().splitlines()[-1]) * 1000, 1),
+        "total_ms": round(sum(m[2] for m in modules) / 1000, 1),
+        "modules": [{"name": n, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+                    for n, s, c in sorted(modules, key=lambda m: -m[2])],
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("scripts", nargs="*", default=["app.py", "app1.py"])
+    p.add_argument("--cold", action="store_true", help="count streamlit itself too")
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--json", help="write the full report here")
+    args = p.parse_args()
+
+    report = []
+    for script in args.scripts:
+        r = measure(script, args.cold)
+        report.append(r)
+        print(f"\n{script}: {r['wall_ms']:.0f} ms wall, {r['total_ms']:.0f} ms in imports"
+              f" ({'cold' if args.cold else 'on top of a running server'})")
+        for m in r["modules"][:args.top]:
+            print(f"  {m['cumulative_ms']:>8.1f} ms  {m['name']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
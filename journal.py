@@ -0,0 +1,145 @@
+"""
+Append-only JSONL journal for per-session progress files.
+
+save_progress used to load logs/{category}_{sid}_progress.json, append one
+record and rewrite the whole list, so each submit cost more than the one
+before it.  Records are now appended as one JSON line each to
+{category}_{sid}_progress.jsonl; the file handle stays open and fsync is
+batched (every FSYNC_EVERY records or FSYNC_INTERVAL seconds, and at exit).
+
+    python journal.py convert [DIR ...]   # turn old *_progress.json files into .jsonl
+
+Run the converter while the app is stopped; it replaces the .jsonl files.
+"""
+import atexit
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+FSYNC_EVERY = 16
+FSYNC_INTERVAL = 2.0   # seconds
+
+
+class Journal:
+    """One append-only JSONL file, safe to share between script threads."""
+
+    def __init__(self, path: str, fsync_every: int = FSYNC_EVERY, fsync_interval: float = FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        if self._file is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            f = self._open()
+            f.write(line)
+            f.flush()
+            self._pending += 1
+            if (self._pending >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(path: str) -> Journal:
+    """Process-wide Journal for path, so concurrent sessions share one handle."""
+    key = os.path.abspath(path)
+    journal = _journals.get(key)
+    if journal is None:
+        with _journals_lock:
+            journal = _journals.setdefault(key, Journal(key))
+    return journal
+
+
+@atexit.register
+def close_all():
+    with _journals_lock:
+        journals = list(_journals.values())
+        _journals.clear()
+    for journal in journals:
+        journal.close()
+
+
+def read_journal(path: str):
+    """
+    Yield the records of a JSONL journal in write order.
+    A torn final line (crash mid-write) is skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def convert_json_log(json_path: str) -> int:
+    """
+    Convert one legacy list-of-records JSON progress file to JSONL.
+
+    Records already journalled under the new name are kept after the
+    converted ones; the old file is renamed to *.json.bak.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    records = data if isinstance(data, list) else [data]
+    jsonl_path = os.path.splitext(json_path)[0] + ".jsonl"
+    newer = list(read_journal(jsonl_path))
+    tmp = jsonl_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records + newer:
+            f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, jsonl_path)
+    os.replace(json_path, json_path + ".bak")
+    return len(records)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "convert":
+        sys.exit("usage: python journal.py convert [DIR ...]")
+    dirs = sys.argv[2:] or ["logs", "db"]
+    for d in dirs:
+        for path in sorted(glob.glob(os.path.join(d, "*_progress.json"))):
+            print(f"{path}: {convert_json_log(path)} records")
@@ -0,0 +1,288 @@
+"""
+Multi-annotator load generator for the storage layer.
+
+Several radiologists submit at once, and every submit lands in the same
+logs/logs.db plus per-session JSONL/CSV files and the annotation log.
+This simulates N annotators, each looping "think, then submit" through the
+same storage paths the apps use: storage.write_progress (or the
+write-behind queue with --queue), storage.write_annotations, and the
+resume_state read done at login.  It reports throughput, latency
+percentiles per operation and how many calls failed with "database is
+locked".
+
+Annotators are threads in one process, like sessions in one Streamlit
+server; --processes spreads them over several processes to mimic more
+than one server sharing the files.  With --remote the annotators save
+through a store server (python backend.py serve) instead, as app replicas
+configured with `storage: {backend: remote}` do; its paths are relative to
+the server's --root.
+
+    python loadgen.py [--annotators 8] [--processes 1] [--duration 30]
+                      [--think 1.0] [--queue] [--remote HOST:PORT]
+                      [--dir DIR] [--json out.json]
+
+Without --dir everything is written to a scratch directory.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from assignment import BLOCK, ai_first
+
+CATEGORIES = ("turing_test", "standard_evaluation", "ai_edit")
+ORGANS = ("LIVER", "PANCREAS", "KIDNEY", "OTHER")
+STUDY = {"seed": b"loadgen", "balanced": False, "block": BLOCK}
+
+
+def is_locked(error: BaseException) -> bool:
+    return "database is locked" in str(error)
+
+
+# --------------------------------------------------
+# One simulated annotator
+# --------------------------------------------------
+class Annotator:
+
+    def __init__(self, user: str, root: str, args, results: list, stop: threading.Event):
+        self.user = user
+        self.spool_dir = os.path.join(root, "logs")
+        data = "" if args.remote else root
+        self.db_path = os.path.join(data, "logs", "logs.db")
+        self.log_dir = os.path.join(data, "logs")
+        self.store_dir = os.path.join(data, "evaluations")
+        self.args = args
+        self.results = results
+        self.stop = stop
+        self.rng = random.Random(user)
+        self.last_case = {c: 0 for c in CATEGORIES}
+
+    def timed(self, op: str, fn, *a, **kw):
+        t0 = time.perf_counter()
+        error = None
+        try:
+            fn(*a, **kw)
+        except Exception as e:
+            error = "locked" if is_locked(e) else type(e).__name__
+        self.results.append((op, time.perf_counter() - t0, error))
+
+    def progress(self, category: str) -> dict:
+        idx = self.last_case[category]
+        case = f"case{idx:04d}"
+        if category == "turing_test":
+            return {"case_id": case, "last_case": idx, "assignment": ai_first(STUDY, self.user, category, case),
+                    "initial_eval": self.rng.choice("AB"), "final_eval": self.rng.choice("AB"),
+                    "viewed_images": True}
+        corrections = [{"case_id": case, "organ": self.rng.choice(ORGANS), "reason": "load test",
+                        "details": "x" * self.rng.randint(0, 200)}]
+        if category == "standard_evaluation":
+            return {"case_id": case, "last_case": idx, "assignment": ai_first(STUDY, self.user, category, case),
+                    "corrections": corrections}
+        return {"case_id": case, "mode": "Free", "assembled": "", "corrections": corrections}
+
+    def run(self):
+        import storage
+        import write_queue
+        from backend import get_backend
+
+        kind = "remote" if self.args.remote else "sqlite"
+        backend = get_backend({"storage": {"backend": kind, "address": self.args.remote}})
+        backend.prepare(self.db_path)
+        wq = write_queue.get_queue(os.path.join(self.spool_dir, f"write_queue_{os.getpid()}.jsonl"), backend) \
+            if self.args.queue else None
+
+        def resume():
+            backend.load_resume(self.db_path, self.user)
+
+        self.timed("load_resume", resume)
+        submits = 0
+        while not self.stop.is_set():
+            if self.args.think > 0:
+                if self.stop.wait(self.rng.expovariate(1.0 / self.args.think)):
+                    break
+            category = self.rng.choice(CATEGORIES)
+            prog = self.progress(category)
+            if prog.get("corrections") and category == "standard_evaluation":
+                if wq:
+                    self.timed("save_annotations", write_queue.submit_annotations,
+                               wq, self.store_dir, prog["case_id"], prog["corrections"])
+                elif not self.args.remote:
+                    self.timed("save_annotations", storage.write_annotations,
+                               self.store_dir, prog["case_id"], prog["corrections"])
+                else:
+                    self.timed("save_annotations", backend.apply, [{
+                        "kind": "annotations", "store_dir": self.store_dir,
+                        "case_id": prog["case_id"], "annotations": prog["corrections"]}])
+            if wq:
+                self.timed("save_progress", write_queue.submit_progress, wq, self.db_path,
+                           self.log_dir, self.user, category, prog, 0, [])
+            elif not self.args.remote:
+                self.timed("save_progress", storage.write_progress, self.db_path,
+                           self.log_dir, self.user, category, prog, 0, [])
+            else:
+                self.timed("save_progress", backend.apply, [{
+                    "kind": "progress", "db_path": self.db_path, "log_dir": self.log_dir,
+                    "session_id": self.user, "category": category, "progress": prog,
+                    "current_slice": 0, "pending": []}])
+            self.last_case[category] += 1
+            submits += 1
+            if self.args.resume_every and submits % self.args.resume_every == 0:
+                self.timed("load_resume", resume)
+
+
+class _CountLocked(logging.Handler):
+    """Counts write-behind worker failures, which are logged rather than raised."""
+
+    def __init__(self):
+        super().__init__()
+        self.failed = 0
+        self.locked = 0
+
+    def emit(self, record):
+        self.failed += 1
+        if record.exc_info and is_locked(record.exc_info[1]):
+            self.locked += 1
+
+
+def run_process(index: int, n: int, root: str, args) -> dict:
+    """Run n annotators as threads for args.duration seconds."""
+    import write_queue
+
+    counter = _CountLocked()
+    for name in ("write_queue", "backend"):
+        logging.getLogger(name).addHandler(counter)
+    results, stop = [], threading.Event()
+    annotators = [Annotator(f"load{index:02d}_{i:03d}", root, args, results, stop) for i in range(n)]
+    threads = [threading.Thread(target=a.run, daemon=True) for a in annotators]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    write_queue.flush_all()
+    drain = time.perf_counter() - t1
+    return {"results": results, "elapsed": elapsed, "drain": drain,
+            "worker_failed": counter.failed, "worker_locked": counter.locked}
+
+
+def _child(index, n, root, args, out):
+    out.put(run_process(index, n, root, args))
+
+
+# --------------------------------------------------
+# Driver
+# --------------------------------------------------
+def prepare(root: str, remote: bool = False):
+    import db
+    from migrations import migrate
+
+    os.makedirs(os.path.join(root, "logs"), exist_ok=True)
+    if remote:
+        return      # the server migrates its own database
+    migrate(os.path.join(root, "logs", "logs.db"), legacy=[])
+    os.makedirs(os.path.join(root, "evaluations"), exist_ok=True)
+    db.close_all()
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(runs: list, args) -> dict:
+    results = [r for run in runs for r in run["results"]]
+    elapsed = max(run["elapsed"] for run in runs)
+    ops = {}
+    for op in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == op]
+        ms = [r[1] * 1000 for r in rows]
+        errors = [r[2] for r in rows if r[2]]
+        ops[op] = {
+            "count": len(rows),
+            "per_sec": round(len(rows) / elapsed, 2),
+            "p50_ms": round(percentile(ms, 50), 3),
+            "p95_ms": round(percentile(ms, 95), 3),
+            "p99_ms": round(percentile(ms, 99), 3),
+            "max_ms": round(max(ms), 3),
+            "errors": len(errors),
+            "locked": errors.count("locked"),
+            "locked_rate": round(errors.count("locked") / len(rows), 5),
+        }
+    return {
+        "annotators": args.annotators, "processes": args.processes, "duration": args.duration,
+        "think": args.think, "queue": args.queue, "remote": args.remote, "elapsed": round(elapsed, 3),
+        "submits_per_sec": ops.get("save_progress", {}).get("per_sec", 0.0),
+        "drain_sec": round(max(run["drain"] for run in runs), 3),
+        "worker_failed": sum(run["worker_failed"] for run in runs),
+        "worker_locked": sum(run["worker_locked"] for run in runs),
+        "ops": ops,
+    }
+
+
+def print_summary(s: dict):
+    print(f"{s['annotators']} annotators / {s['processes']} process(es), think {s['think']}s, "
+          f"{'write-behind queue' if s['queue'] else 'synchronous writes'}"
+          f"{' via ' + s['remote'] if s['remote'] else ''}, {s['elapsed']:.1f}s")
+    print(f"{'operation':<18}{'count':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'locked':>8}{'errors':>8}")
+    for op, o in s["ops"].items():
+        print(f"{op:<18}{o['count']:>8}{o['per_sec']:>9.1f}{o['p50_ms']:>9.1f}{o['p95_ms']:>9.1f}"
+              f"{o['p99_ms']:>9.1f}{o['max_ms']:>9.1f}{o['locked']:>8}{o['errors']:>8}")
+    if s["queue"]:
+        print(f"queue drained in {s['drain_sec']:.2f}s; worker failures {s['worker_failed']} "
+              f"({s['worker_locked']} locked)")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--annotators", type=int, default=8)
+    p.add_argument("--processes", type=int, default=1)
+    p.add_argument("--duration", type=float, default=30.0, help="seconds")
+    p.add_argument("--think", type=float, default=1.0, help="mean think time in seconds (0 = none)")
+    p.add_argument("--resume-every", type=int, default=20, help="re-read resume state every N submits")
+    p.add_argument("--queue", action="store_true", help="save through the write-behind queue")
+    p.add_argument("--remote", metavar="HOST:PORT", help="save through a store server")
+    p.add_argument("--dir", help="existing data root (logs/, evaluations/) to write into")
+    p.add_argument("--json", help="write the summary here")
+    args = p.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="cpta-load-")
+    try:
+        prepare(root, bool(args.remote))
+        share = [args.annotators // args.processes + (i < args.annotators % args.processes)
+                 for i in range(args.processes)]
+        if args.processes == 1:
+            runs = [run_process(0, share[0], root, args)]
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            out = ctx.Queue()
+            procs = [ctx.Process(target=_child, args=(i, n, root, args, out)) for i, n in enumerate(share)]
+            for proc in procs:
+                proc.start()
+            runs = [out.get() for _ in procs]
+            for proc in procs:
+                proc.join()
+        summary = summarize(runs, args)
+    finally:
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
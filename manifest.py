@@ -0,0 +1,173 @@
+"""
+Precomputed index of the case image tree.
+
+The apps used to list BASE_IMAGE_DIR on every rerun and list/sort the
+current case folder on every slice click.  The manifest scans the tree once,
+stores case IDs, slice filenames and report files in .cache/, and is only
+rebuilt when the base directory or one of its case folders changes mtime.
+
+Slices are ordered by the instance number embedded in their DICOM-UID
+filenames ("...-1-<n>-<suffix>.jpg"); a plain lexicographic sort put
+slice 105 before slice 12.
+
+    python manifest.py [BASE_IMAGE_DIR]   # rebuild the index by hand
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+CACHE_DIR = ".cache"
+MANIFEST_VERSION = 1
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+REPORT_FILES = ("text.txt", "pred.txt")
+CHECK_INTERVAL = 5.0   # seconds between mtime checks of an in-memory manifest
+
+_SLICE_RE = re.compile(r"-1-(\d+)-")
+
+
+def slice_sort_key(fname: str):
+    """Numeric slice order, falling back to the name for non-UID files."""
+    m = _SLICE_RE.search(fname)
+    return (0, int(m.group(1)), fname) if m else (1, 0, fname)
+
+
+def manifest_path(base_dir: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.normpath(base_dir).strip("/\\"))
+    return os.path.join(CACHE_DIR, f"manifest-{name}.json")
+
+
+def _signature(base_dir: str, case_ids) -> dict:
+    """mtimes of the base directory and every case folder."""
+    sig = {".": os.stat(base_dir).st_mtime_ns}
+    for case_id in case_ids:
+        try:
+            sig[case_id] = os.stat(os.path.join(base_dir, case_id)).st_mtime_ns
+        except OSError:
+            sig[case_id] = None
+    return sig
+
+
+def scan(base_dir: str) -> dict:
+    """Walk base_dir once and return the manifest as a plain dict."""
+    cases = []
+    with os.scandir(base_dir) as entries:
+        case_dirs = sorted(e.name for e in entries if e.is_dir())
+    for case_id in case_dirs:
+        folder = os.path.join(base_dir, case_id)
+        slices, reports = [], {}
+        with os.scandir(folder) as entries:
+            for e in entries:
+                if not e.is_file():
+                    continue
+                if e.name.lower().endswith(IMAGE_EXTS):
+                    slices.append(e.name)
+                elif e.name in REPORT_FILES:
+                    st = e.stat()
+                    reports[e.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        slices.sort(key=slice_sort_key)
+        cases.append({"id": case_id, "slices": slices, "reports": reports})
+    return {
+        "version": MANIFEST_VERSION,
+        "base_dir": base_dir,
+        "built_at": time.time(),
+        "signature": _signature(base_dir, case_dirs),
+        "cases": cases,
+    }
+
+
+class Manifest:
+    """Read-only view over a scanned image tree."""
+
+    def __init__(self, base_dir: str, data: dict):
+        self.base_dir = base_dir
+        self.data = data
+        self.case_ids = [c["id"] for c in data["cases"]]
+        self._cases = {c["id"]: c for c in data["cases"]}
+        self.checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.case_ids)
+
+    def slice_names(self, case_id: str) -> list:
+        case = self._cases.get(case_id)
+        return case["slices"] if case else []
+
+    def slice_paths(self, case_id: str) -> list:
+        folder = os.path.join(self.base_dir, case_id)
+        return [os.path.join(folder, f) for f in self.slice_names(case_id)]
+
+    def report_path(self, case_id: str, name: str) -> str:
+        return os.path.join(self.base_dir, case_id, name)
+
+    def report_info(self, case_id: str, name: str):
+        case = self._cases.get(case_id)
+        return case["reports"].get(name) if case else None
+
+    def is_stale(self) -> bool:
+        try:
+            return _signature(self.base_dir, self.case_ids) != self.data["signature"]
+        except OSError:
+            return True
+
+
+def build_manifest(base_dir: str) -> Manifest:
+    data = scan(base_dir)
+    path = manifest_path(base_dir)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return Manifest(base_dir, data)
+
+
+def _read_manifest(base_dir: str):
+    try:
+        with open(manifest_path(base_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != MANIFEST_VERSION:
+        return None
+    manifest = Manifest(base_dir, data)
+    return None if manifest.is_stale() else manifest
+
+
+_manifests = {}
+_lock = threading.Lock()
+
+
+def load_manifest(base_dir: str) -> Manifest:
+    """
+    Return the manifest for base_dir, shared by all sessions in the process.
+
+    The on-disk index is reused across restarts; the in-memory copy is
+    re-validated against directory mtimes at most every CHECK_INTERVAL
+    seconds, so a rerun normally costs a dict lookup.
+    """
+    manifest = _manifests.get(base_dir)
+    if manifest is not None and time.monotonic() - manifest.checked_at < CHECK_INTERVAL:
+        return manifest
+    with _lock:
+        manifest = _manifests.get(base_dir)
+        if manifest is not None and time.monotonic() - manifest.checked_at < CHECK_INTERVAL:
+            return manifest
+        if manifest is not None and not manifest.is_stale():
+            manifest.checked_at = time.monotonic()
+            return manifest
+        if not os.path.isdir(base_dir):
+            manifest = Manifest(base_dir, {"signature": {}, "cases": []})
+        else:
+            manifest = _read_manifest(base_dir) or build_manifest(base_dir)
+        _manifests[base_dir] = manifest
+        return manifest
+
+
+if __name__ == "__main__":
+    base = sys.argv[1] if len(sys.argv) > 1 else "2D_Image_clean"
+    m = build_manifest(base)
+    n_slices = sum(len(c["slices"]) for c in m.data["cases"])
+    print(f"{manifest_path(base)}: {len(m)} cases, {n_slices} slices")
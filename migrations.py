@@ -0,0 +1,212 @@
+"""
+Numbered, once-only schema migrations.
+
+init_db() used to run its CREATE TABLE IF NOT EXISTS statements (and the
+column/index checks) on every rerun, twice in app1.py, whose storage
+section existed once for db/progress.db and once for logs/logs.db.
+Databases now carry a schema_version table; ensure_migrated() applies the
+migrations it has not recorded yet, each in its own BEGIN IMMEDIATE
+transaction, and remembers the result for the lifetime of the process, so
+later reruns skip it with a set lookup.
+
+Migration 4 folds the legacy db/progress.db (written by app1.py's first
+storage section) into logs/logs.db; the old file is left in place.
+
+    python migrations.py [DB] [--status] [--merge PATH ...]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import db
+from schema import (
+    PROMOTED_COLUMNS, ensure_progress_schema, ensure_resume_state, promoted_values, resume_row,
+)
+
+DEFAULT_DB = os.path.join("logs", "logs.db")
+LEGACY_DATABASES = [os.path.join("db", "progress.db")]
+MERGE_CHUNK = 1000
+
+# Keeps the legacy row's payload and time rather than re-serialising
+MERGE_PROGRESS_SQL = (
+    "INSERT INTO progress_logs(session_id, category, progress_json, timestamp, "
+    + ", ".join(PROMOTED_COLUMNS)
+    + ") VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP)" + ", ?" * len(PROMOTED_COLUMNS) + ")"
+)
+
+VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+# --------------------------------------------------
+# Migrations: fn(conn, context) inside the caller's transaction
+# --------------------------------------------------
+def _base_tables(conn, context):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS progress_logs (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          session_id TEXT,
+          category TEXT,
+          progress_json TEXT,
+          timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""")
+    # Superseded by annotation_store; kept for the rows it already holds
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS annotations (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          case_id TEXT,
+          annotations_json TEXT,
+          timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""")
+
+
+def _promoted_columns(conn, context):
+    ensure_progress_schema(conn)
+
+
+def _resume_state(conn, context):
+    ensure_resume_state(conn)
+
+
+def _merge_legacy(conn, context):
+    for path in context.get("legacy", LEGACY_DATABASES):
+        if os.path.exists(path) and os.path.abspath(path) != os.path.abspath(context["db_path"]):
+            merge_database(conn, path)
+
+
+MIGRATIONS = [
+    (1, "base tables", _base_tables),
+    (2, "promoted progress columns and indexes", _promoted_columns),
+    (3, "resume_state", _resume_state),
+    (4, "merge db/progress.db", _merge_legacy),
+]
+
+
+def merge_database(conn, path: str) -> dict:
+    """
+    Copy progress_logs and annotations rows from the database at path,
+    in id order.  resume_state rows are added for users the target has
+    none for.  Returns row counts.
+    """
+    src = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    counts = {"progress_logs": 0, "annotations": 0}
+    try:
+        tables = {r[0] for r in src.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        latest = {}
+        if "progress_logs" in tables:
+            cur = src.execute(
+                "SELECT session_id, category, progress_json, timestamp FROM progress_logs ORDER BY id"
+            )
+            while True:
+                rows = cur.fetchmany(MERGE_CHUNK)
+                if not rows:
+                    break
+                for session_id, category, blob, timestamp in rows:
+                    try:
+                        progress = json.loads(blob) if blob else {}
+                    except ValueError:
+                        progress = {}
+                    conn.execute(
+                        MERGE_PROGRESS_SQL,
+                        (session_id, category, blob, timestamp) + promoted_values(progress),
+                    )
+                    latest[(session_id, category)] = progress
+                    counts["progress_logs"] += 1
+        if "annotations" in tables:
+            cur = src.execute("SELECT case_id, annotations_json, timestamp FROM annotations ORDER BY id")
+            while True:
+                rows = cur.fetchmany(MERGE_CHUNK)
+                if not rows:
+                    break
+                conn.executemany(
+                    "INSERT INTO annotations(case_id, annotations_json, timestamp) VALUES (?, ?, ?)", rows
+                )
+                counts["annotations"] += len(rows)
+        for (session_id, category), progress in latest.items():
+            if session_id is None or category is None:
+                continue
+            conn.execute(
+                "INSERT OR IGNORE INTO resume_state(user, category, last_case, current_slice, pending_corrections) "
+                "VALUES (?, ?, ?, ?, ?)",
+                resume_row(session_id, category, progress),
+            )
+    finally:
+        src.close()
+    return counts
+
+
+# --------------------------------------------------
+# Runner
+# --------------------------------------------------
+def current_version(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(db_path: str, legacy=None) -> list:
+    """Apply pending migrations; returns the (version, name) pairs applied."""
+    context = {"db_path": db_path}
+    if legacy is not None:
+        context["legacy"] = legacy
+    applied = []
+    with db.connection(db_path) as conn:
+        conn.execute(VERSION_DDL)
+        for version, name, fn in MIGRATIONS:
+            # IMMEDIATE takes the write lock up front, so two processes
+            # starting together apply each migration once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if current_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                fn(conn, context)
+                conn.execute("INSERT INTO schema_version(version, name) VALUES (?, ?)", (version, name))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            applied.append((version, name))
+    return applied
+
+
+_migrated = set()
+_lock = threading.Lock()
+
+
+def ensure_migrated(db_path: str = DEFAULT_DB):
+    """Migrate db_path once per process; afterwards a set lookup."""
+    key = os.path.abspath(db_path)
+    if key in _migrated:
+        return
+    with _lock:
+        if key in _migrated:
+            return
+        migrate(db_path)
+        _migrated.add(key)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Apply numbered schema migrations.")
+    p.add_argument("db", nargs="?", default=DEFAULT_DB)
+    p.add_argument("--status", action="store_true", help="show applied migrations and exit")
+    p.add_argument("--merge", nargs="*", metavar="PATH",
+                   help=f"legacy databases for the merge migration (default: {' '.join(LEGACY_DATABASES)})")
+    args = p.parse_args()
+    if args.status:
+        with db.connection(args.db) as conn:
+            done = dict(conn.execute("SELECT version, applied_at FROM schema_version")) \
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE name='schema_version'").fetchone() else {}
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:>3}  {'applied ' + done[version] if version in done else 'pending':<28}  {name}")
+    else:
+        applied = migrate(args.db, args.merge)
+        for version, name in applied:
+            print(f"{args.db}: applied {version} {name}")
+        if not applied:
+            print(f"{args.db}: up to date")
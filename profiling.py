@@ -0,0 +1,218 @@
+"""
+Named timing spans for the rerun hot path.
+
+There was no way to tell where a rerun's time went (login widget,
+credentials, init_db, case discovery, report loading, the carousel, the
+page itself).  Code marks sections with
+
+    with span("init_db"):
+        init_db()
+
+    @timed("display_carousel")
+    def display_carousel(...): ...
+
+Each finished span goes into a ring buffer owned by the current session
+(the last RING_SIZE spans) and into a per-process aggregate (count, total,
+max and a window of recent durations for percentiles).  Admins listed under
+`admins:` in config.yaml get a sidebar panel to switch recording on and off,
+inspect both views, and dump them to logs/.
+
+Recording is off unless CPTA_PROFILE=1 or `profiling: true` is set in
+config.yaml (or an admin switches it on).  While off, span() returns a
+shared no-op context manager, so instrumented code pays one global lookup.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+RING_SIZE = 500          # spans kept per session
+WINDOW = 1024            # recent durations kept per span name for percentiles
+DUMP_DIR = "logs"
+
+ENABLED = os.environ.get("CPTA_PROFILE", "") not in ("", "0")
+
+_NULL = nullcontext()
+_local = threading.local()
+
+
+class _Stats:
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def set_enabled(on: bool):
+    global ENABLED
+    ENABLED = bool(on)
+
+
+def configure(config: dict):
+    """Pick up `profiling: true` from the app config (the env var wins if set)."""
+    if "CPTA_PROFILE" not in os.environ and config.get("profiling"):
+        set_enabled(True)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name: str):
+    """Context manager timing one section; a shared no-op when disabled."""
+    return _Span(name) if ENABLED else _NULL
+
+
+def timed(name: str):
+    """Decorator form of span() for whole functions."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def start_rerun(session_state):
+    """
+    Attach this script thread to the session's ring buffer.  Call once at
+    the top of the script; spans recorded on this thread go to that ring.
+    """
+    _local.ring = None
+    if not ENABLED:
+        return
+    ring = session_state.get("_profile_spans")
+    if ring is None:
+        ring = session_state["_profile_spans"] = deque(maxlen=RING_SIZE)
+    session_state["_profile_rerun"] = session_state.get("_profile_rerun", 0) + 1
+    _local.ring = ring
+    _local.rerun = session_state["_profile_rerun"]
+    _local.started = time.perf_counter()
+
+
+def finish_rerun():
+    """Record the whole script as "rerun" (skipped when it ends in st.rerun/st.stop)."""
+    if getattr(_local, "ring", None) is not None:
+        _record("rerun", time.perf_counter() - _local.started)
+        _local.ring = None
+
+
+def _record(name: str, seconds: float):
+    ring = getattr(_local, "ring", None)
+    if ring is not None:
+        ring.append((time.time(), getattr(_local, "rerun", 0), name, seconds))
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = _Stats()
+        stats.add(seconds)
+
+
+def _percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def aggregate() -> list:
+    """Process-wide rows: name, count, mean/p50/p95/max in ms, total in s."""
+    with _stats_lock:
+        items = [(name, s.count, s.total, s.max, sorted(s.recent)) for name, s in _stats.items()]
+    rows = []
+    for name, count, total, mx, recent in items:
+        rows.append({
+            "span": name,
+            "count": count,
+            "mean_ms": round(total / count * 1000, 3),
+            "p50_ms": round(_percentile(recent, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(recent, 0.95) * 1000, 3),
+            "max_ms": round(mx * 1000, 3),
+            "total_s": round(total, 3),
+        })
+    rows.sort(key=lambda r: r["total_s"], reverse=True)
+    return rows
+
+
+def session_spans(session_state) -> list:
+    ring = session_state.get("_profile_spans") or ()
+    return [{"time": t, "rerun": r, "span": n, "ms": round(s * 1000, 3)} for t, r, n, s in ring]
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def dump(path: str = None, session_state=None) -> str:
+    """Write the aggregate (and this session's ring, if given) as JSON."""
+    if path is None:
+        os.makedirs(DUMP_DIR, exist_ok=True)
+        path = os.path.join(DUMP_DIR, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+    data = {"pid": os.getpid(), "dumped_at": time.time(), "aggregate": aggregate()}
+    if session_state is not None:
+        data["session"] = session_spans(session_state)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def is_admin(config: dict, username: str) -> bool:
+    return bool(username) and username in (config.get("admins") or [])
+
+
+def render_panel(session_state):
+    """Sidebar expander with the controls and both views (admins only)."""
+    import streamlit as st
+
+    with st.sidebar.expander("⏱ Profiling"):
+        # A button rather than a toggle: recording is process-wide, and a
+        # stale toggle in another admin's session would flip it back
+        if st.button("Stop recording" if ENABLED else "Start recording", key="_profile_switch"):
+            set_enabled(not ENABLED)
+            st.rerun()
+        rows = aggregate()
+        st.caption("Process (all sessions)")
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.write("— nothing recorded —")
+        spans = session_spans(session_state)
+        st.caption("This session (latest first)")
+        if spans:
+            st.dataframe(spans[::-1][:100], hide_index=True)
+        c1, c2 = st.columns(2)
+        if c1.button("Dump", key="_profile_dump"):
+            st.success(f"Wrote {dump(session_state=session_state)}")
+        if c2.button("Reset", key="_profile_reset"):
+            reset()
+            session_state.pop("_profile_spans", None)
+            st.rerun()
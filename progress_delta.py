@@ -0,0 +1,216 @@
+"""
+Per-case deltas for progress records.
+
+save_progress used to store the reader's whole state with every submit:
+the full assignments map and every correction still in the session, in
+progress_logs and again in the per-session JSONL and CSV files.  A record
+therefore grew with each case completed, and a study's storage with the
+square of its length.
+
+Records are now stored as the delta for their own case:
+
+    {"v": 2, "case_id": ..., "last_case": ..., "assignment": <this case's
+     entry of the assignments map>, "corrections": [<this case's only>],
+     "initial_eval": ..., ...}
+
+Scalars are kept as they are.  Corrections left open for other cases are
+already stored in resume_state.  reconstruct() rebuilds the old full
+record for a session and category by replaying its rows in id order; rows
+written before this change (no "v") are taken as full snapshots.
+
+    python progress_delta.py convert [DB] [--chunk 1000] [--vacuum]
+    python progress_delta.py show SESSION CATEGORY [DB]
+"""
+import argparse
+import json
+import os
+
+import db
+
+DELTA_VERSION = 2
+CONVERT_CHUNK = 1000
+
+# SQL for a row's own assignment: the delta field, or its entry in a
+# full-snapshot row's map
+ASSIGNMENT_SQL = (
+    "COALESCE(json_extract(progress_json, '$.assignment'), "
+    "json_extract(progress_json, '$.assignments.\"' || case_id || '\"'))"
+)
+
+# Column order of the per-session CSV copies; other keys are in the JSONL only
+CSV_COLUMNS = {
+    "turing_test":         ["v", "case_id", "last_case", "assignment", "initial_eval", "final_eval",
+                            "viewed_images"],
+    "standard_evaluation": ["v", "case_id", "last_case", "assignment", "corrections"],
+    "ai_edit":             ["v", "case_id", "mode", "assembled", "corrections"],
+}
+
+
+def is_delta(progress: dict) -> bool:
+    return progress.get("v") == DELTA_VERSION
+
+
+def to_delta(progress: dict) -> dict:
+    """This case's part of a full progress record (deltas pass through)."""
+    if is_delta(progress):
+        return progress
+    case_id = progress.get("case_id")
+    delta = {"v": DELTA_VERSION}
+    for key, value in progress.items():
+        if key == "assignments":
+            if isinstance(value, dict) and str(case_id) in value:
+                delta["assignment"] = value[str(case_id)]
+        elif key == "corrections":
+            if isinstance(value, list):
+                # Corrections without a case_id cannot be attributed; keep them
+                delta["corrections"] = [
+                    c for c in value
+                    if not isinstance(c, dict) or str(c.get("case_id", case_id)) == str(case_id)
+                ]
+            else:
+                delta["corrections"] = value
+        else:
+            delta[key] = value
+    return delta
+
+
+# --------------------------------------------------
+# Reconstruction
+# --------------------------------------------------
+class _State:
+    """Running full state for one session and category."""
+
+    def __init__(self):
+        self.scalars = {}
+        self.assignments = {}
+        self.corrections = {}      # case_id -> that case's corrections, in first-seen order
+
+    def apply(self, progress: dict):
+        case_id = progress.get("case_id")
+        for key, value in progress.items():
+            if key not in ("v", "assignment", "assignments", "corrections"):
+                self.scalars[key] = value
+        if is_delta(progress):
+            if "assignment" in progress:
+                self.assignments[str(case_id)] = progress["assignment"]
+            if isinstance(progress.get("corrections"), list):
+                self.corrections[str(case_id)] = progress["corrections"]
+        else:
+            if isinstance(progress.get("assignments"), dict):
+                self.assignments.update(progress["assignments"])
+            if isinstance(progress.get("corrections"), list):
+                by_case = {}
+                for c in progress["corrections"]:
+                    key = c.get("case_id", case_id) if isinstance(c, dict) else case_id
+                    by_case.setdefault(str(key), []).append(c)
+                self.corrections.update(by_case)
+
+    def full(self) -> dict:
+        out = dict(self.scalars)
+        out["assignments"] = dict(self.assignments)
+        out["corrections"] = [c for cs in self.corrections.values() for c in cs]
+        return out
+
+
+def _rows(conn, session_id: str, category: str, upto_id: int = None):
+    sql = "SELECT id, progress_json FROM progress_logs WHERE session_id=? AND category=?"
+    params = [session_id, category]
+    if upto_id is not None:
+        sql += " AND id<=?"
+        params.append(upto_id)
+    cur = conn.execute(sql + " ORDER BY id", params)
+    while True:
+        rows = cur.fetchmany(CONVERT_CHUNK)
+        if not rows:
+            break
+        for row_id, blob in rows:
+            try:
+                progress = json.loads(blob) if blob else {}
+            except ValueError:
+                continue
+            if isinstance(progress, dict):
+                yield row_id, progress
+
+
+def iter_states(conn, session_id: str, category: str, upto_id: int = None):
+    """(row id, full record as of that row) for each of the session's rows."""
+    state = _State()
+    for row_id, progress in _rows(conn, session_id, category, upto_id):
+        state.apply(progress)
+        yield row_id, state.full()
+
+
+def reconstruct(conn, session_id: str, category: str, upto_id: int = None) -> dict:
+    """
+    The full record (assignments map, all submitted corrections, latest
+    scalars) for session_id and category, as of row upto_id (default: the
+    latest).  {} when the session has no rows.
+    """
+    state = _State()
+    seen = False
+    for _, progress in _rows(conn, session_id, category, upto_id):
+        state.apply(progress)
+        seen = True
+    return state.full() if seen else {}
+
+
+# --------------------------------------------------
+# Converter for rows written as full snapshots
+# --------------------------------------------------
+def convert(db_path: str, chunk: int = CONVERT_CHUNK) -> dict:
+    """
+    Rewrite every full-snapshot row as its delta, chunk rows per
+    transaction, in id order; safe to interrupt and rerun.  Returns row
+    counts and the bytes of progress_json before and after.
+    """
+    counts = {"rows": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    while True:
+        with db.transaction(db_path) as conn:
+            rows = conn.execute(
+                "SELECT id, progress_json FROM progress_logs WHERE id>? ORDER BY id LIMIT ?",
+                (last_id, chunk),
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, blob in rows:
+                try:
+                    progress = json.loads(blob) if blob else None
+                except ValueError:
+                    progress = None
+                if not isinstance(progress, dict) or is_delta(progress):
+                    continue
+                new = json.dumps(to_delta(progress))
+                updates.append((new, row_id))
+                counts["bytes_before"] += len(blob)
+                counts["bytes_after"] += len(new)
+            conn.executemany("UPDATE progress_logs SET progress_json=? WHERE id=?", updates)
+            counts["rows"] += len(updates)
+            last_id = rows[-1][0]
+    return counts
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Per-case progress deltas: convert old rows, rebuild full state.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    cv = sub.add_parser("convert", help="rewrite full-snapshot rows as deltas")
+    cv.add_argument("db", nargs="?", default=os.path.join("logs", "logs.db"))
+    cv.add_argument("--chunk", type=int, default=CONVERT_CHUNK, help="rows per transaction")
+    cv.add_argument("--vacuum", action="store_true", help="reclaim the freed space afterwards")
+    sh = sub.add_parser("show", help="print a session's reconstructed full record")
+    sh.add_argument("session_id")
+    sh.add_argument("category")
+    sh.add_argument("db", nargs="?", default=os.path.join("logs", "logs.db"))
+    args = p.parse_args()
+
+    if args.cmd == "convert":
+        c = convert(args.db, args.chunk)
+        print(f"{args.db}: {c['rows']} rows converted, progress_json "
+              f"{c['bytes_before'] / 1e6:.1f} MB -> {c['bytes_after'] / 1e6:.1f} MB")
+        if args.vacuum:
+            with db.connection(args.db) as conn:
+                conn.execute("VACUUM")
+    else:
+        with db.connection(args.db) as conn:
+            print(json.dumps(reconstruct(conn, args.session_id, args.category), indent=2))
@@ -0,0 +1,97 @@
+"""
+Process-wide cache of report text (text.txt / pred.txt).
+
+load_text used to open and read both reports on every rerun of the Turing
+test, evaluation and AI-edit pages, including reruns caused only by moving
+through slices.  Reports are now read once per change: entries are keyed
+on path and validated against (mtime_ns, size) with a single stat, shared
+by all sessions, and evicted least-recently-used once they hold more than
+MAX_CACHE_BYTES of text.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class ReportCache:
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # path -> (mtime_ns, size, text, nbytes), LRU order
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path: str) -> str:
+        """Contents of path, or "" if it does not exist."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return ""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return ""
+        self._store(path, st.st_mtime_ns, st.st_size, text)
+        return text
+
+    def _store(self, path, mtime_ns, size, text):
+        nbytes = sys.getsizeof(text)
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._nbytes -= old[3]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[path] = (mtime_ns, size, text, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted[3]
+
+    def discard(self, path: str):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._nbytes -= old[3]
+
+    def warm(self, manifest, names=("text.txt", "pred.txt")):
+        """Read every case's reports ahead of the first request."""
+        for case_id in manifest.case_ids:
+            for name in names:
+                if manifest.report_info(case_id, name):
+                    self.read(manifest.report_path(case_id, name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._nbytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+
+_cache = ReportCache()
+
+
+def get_report_cache() -> ReportCache:
+    return _cache
+
+
+def read_report(path: str) -> str:
+    return _cache.read(path)
@@ -0,0 +1,193 @@
+"""
+Paginated, SQL-side explorer for progress_logs.
+
+view_all_results used to load every row of every category into pandas,
+json.loads each blob, expand it with apply(pd.Series) and render the lot.
+The explorer pushes filtering (session, case, date range), projection of
+the chosen columns and keyset pagination ("id > last id seen") into SQLite,
+so one page costs the same whatever the size of the log.  Fields that are
+not promoted columns are read with json_extract.
+
+The overview above the explorer aggregates whole categories; it reads from
+results_cache, which only parses rows newer than the last refresh.
+"""
+from datetime import timedelta
+
+import streamlit as st
+
+import db
+from progress_delta import ASSIGNMENT_SQL
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+CATEGORIES = {
+    "turing_test":         "Turing Test Logs",
+    "standard_evaluation": "Standard Eval Logs",
+    "ai_edit":             "AI Report Edit Logs",
+}
+
+
+def _json(field: str) -> str:
+    return f"json_extract(progress_json, '$.{field}')"
+
+
+# Selectable columns per category: label -> SQL expression
+COLUMNS = {
+    "turing_test": {
+        "Case":          "last_case + 1",
+        "session_id":    "session_id",
+        "timestamp":     "timestamp",
+        "case_id":       "case_id",
+        "initial_eval":  "initial_eval",
+        "final_eval":    "final_eval",
+        "viewed_images": _json("viewed_images"),
+        "ai_is_a":       ASSIGNMENT_SQL,
+    },
+    "standard_evaluation": {
+        "Case":          "last_case + 1",
+        "session_id":    "session_id",
+        "timestamp":     "timestamp",
+        "case_id":       "case_id",
+        "ai_is_a":       ASSIGNMENT_SQL,
+        "corrections":   _json("corrections"),
+    },
+    "ai_edit": {
+        "session_id":    "session_id",
+        "timestamp":     "timestamp",
+        "case_id":       "case_id",
+        "mode":          "mode",
+        "assembled":     _json("assembled"),
+        "corrections":   _json("corrections"),
+    },
+}
+
+# Bulky JSON columns are opt-in
+DEFAULT_HIDDEN = {"corrections", "assembled"}
+
+
+def build_query(category, columns, session_id=None, case_id=None,
+                date_from=None, date_to=None, after_id=0, limit=50):
+    """
+    SELECT for one page of a category.  Served by the (session_id, category, id)
+    or (category, id) index; date bounds are inclusive calendar days.
+    """
+    exprs = COLUMNS[category]
+    select = ["id"] + [f'{exprs[c]} AS "{c}"' for c in columns if c in exprs]
+    where, params = ["category = ?"], [category]
+    if session_id:
+        where.append("session_id = ?")
+        params.append(session_id)
+    if case_id:
+        where.append("case_id = ?")
+        params.append(case_id)
+    if date_from:
+        where.append("timestamp >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        where.append("timestamp < ?")
+        params.append((date_to + timedelta(days=1)).isoformat())
+    where.append("id > ?")
+    params.append(after_id)
+    sql = (
+        f"SELECT {', '.join(select)} FROM progress_logs "
+        f"WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+    )
+    return sql, params + [limit]
+
+
+def fetch_page(db_path, category, columns, limit=50, **filters):
+    """
+    Returns (column names, rows, next_after_id).  next_after_id is None on
+    the last page.  One extra row is fetched to detect that.
+    """
+    sql, params = build_query(category, columns, limit=limit + 1, **filters)
+    with db.connection(db_path) as conn:
+        cur = conn.execute(sql, params)
+        names = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return names, rows, (rows[-1][0] if more else None)
+
+
+def list_sessions(db_path) -> list:
+    with db.connection(db_path) as conn:
+        return [r[0] for r in conn.execute(
+            "SELECT DISTINCT session_id FROM progress_logs "
+            "WHERE session_id IS NOT NULL ORDER BY session_id"
+        )]
+
+
+def render_overview(db_path):
+    """
+    Per-session summary of every category, built from the shared incremental
+    cache so a refresh only parses rows written since the last one.
+    """
+    from results_cache import get_cache
+
+    cache = get_cache()
+    with st.expander("Overview", expanded=True):
+        for category, label in CATEGORIES.items():
+            frame = cache.frame(db_path, category)
+            st.markdown(f"**{label}**")
+            if frame.empty:
+                st.write("— no entries —")
+                continue
+            summary = frame.groupby("session_id", observed=True).agg(
+                entries=("id", "size"),
+                last_case=("last_case", "max"),
+                last_saved=("timestamp", "max"),
+            )
+            summary["last_case"] = summary["last_case"] + 1
+            st.dataframe(summary)
+
+
+def render_explorer(db_path):
+    """Filter form, one page of results and Prev/Next page controls."""
+    import pandas as pd
+
+    c1, c2, c3 = st.columns(3)
+    category = c1.selectbox("Category", list(CATEGORIES), format_func=CATEGORIES.get, key="res_category")
+    session = c2.selectbox("Session", ["(all)"] + list_sessions(db_path), key="res_session")
+    case_id = c3.text_input("Case ID", key="res_case").strip()
+    d1, d2, d3 = st.columns(3)
+    date_from = d1.date_input("From", value=None, key="res_from")
+    date_to = d2.date_input("To", value=None, key="res_to")
+    page_size = d3.selectbox("Rows per page", PAGE_SIZES, index=1, key="res_page_size")
+    available = list(COLUMNS[category])
+    columns = st.multiselect(
+        "Columns", available,
+        default=[c for c in available if c not in DEFAULT_HIDDEN],
+        key=f"res_columns_{category}",
+    )
+
+    filters = {
+        "session_id": None if session == "(all)" else session,
+        "case_id": case_id or None,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    # Cursor stack: after_id of every page visited; reset when filters change
+    fkey = (category, tuple(sorted((k, str(v)) for k, v in filters.items())), page_size)
+    if st.session_state.get("res_filter_key") != fkey:
+        st.session_state.res_filter_key = fkey
+        st.session_state.res_cursors = [0]
+    cursors = st.session_state.res_cursors
+
+    names, rows, next_after = fetch_page(
+        db_path, category, columns, limit=page_size, after_id=cursors[-1], **filters
+    )
+    st.subheader(CATEGORIES[category])
+    if rows:
+        st.dataframe(pd.DataFrame(rows, columns=names).set_index("id"))
+    else:
+        st.write("— no entries —")
+
+    p1, p2, p3 = st.columns([1, 6, 1])
+    if p1.button("⟨ Page", disabled=len(cursors) == 1, key="res_prev"):
+        cursors.pop()
+        st.rerun()
+    p2.caption(f"Page {len(cursors)}")
+    if p3.button("Page ⟩", disabled=next_after is None, key="res_next"):
+        cursors.append(next_after)
+        st.rerun()
@@ -0,0 +1,148 @@
+"""
+Incremental, process-wide cache of progress_logs as pandas frames.
+
+Aggregate views (per-session overview, analytics) need every row of a
+category, and re-reading and re-parsing the whole log on every visit does
+not scale during a live reading study.  The cache keeps one columnar frame
+per (database, category) together with the highest id it has seen; a
+refresh only fetches and parses rows with a larger id and appends them.
+
+Frames are shared by all sessions.  When their total size exceeds
+MAX_CACHE_BYTES, or the machine runs low on memory, the least recently used
+frames are dropped and rebuilt on next use.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import db
+
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+MIN_FREE_BYTES = 256 * 1024 * 1024     # evict everything else below this much free RAM
+
+BASE_COLUMNS = ["id", "session_id", "timestamp", "case_id", "last_case",
+                "initial_eval", "final_eval", "mode"]
+CATEGORICAL = ["session_id", "case_id", "initial_eval", "final_eval", "mode"]
+
+
+def _free_memory() -> int:
+    """
+    MemAvailable in bytes, or -1 where /proc/meminfo does not report it.
+    (MemFree, what sysconf offers, leaves out reclaimable page cache and is
+    routinely below MIN_FREE_BYTES on a busy server.)
+    """
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return -1
+
+
+def _flatten(rows):
+    """One record per row: promoted columns plus the remaining JSON fields."""
+    records = []
+    for row in rows:
+        rec = dict(zip(BASE_COLUMNS, row[:-1]))
+        try:
+            extra = json.loads(row[-1]) if row[-1] else {}
+        except ValueError:
+            extra = {}
+        for k, v in extra.items():
+            if k in rec:
+                continue
+            rec[k] = json.dumps(v) if isinstance(v, (dict, list)) else v
+        records.append(rec)
+    return records
+
+
+class _Entry:
+    def __init__(self):
+        self.frame = None
+        self.high_water = 0
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+
+class ResultsCache:
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # (db_path, category) -> _Entry, LRU order
+        self._lock = threading.Lock()
+
+    def _entry(self, key) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._entries.move_to_end(key)
+            return entry
+
+    def frame(self, db_path: str, category: str):
+        """The full frame for category, brought up to date with the database."""
+        import pandas as pd
+
+        key = (os.path.abspath(db_path), category)
+        entry = self._entry(key)
+        with entry.lock:
+            with db.connection(db_path) as conn:
+                max_id = conn.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM progress_logs WHERE category=?", (category,)
+                ).fetchone()[0]
+                if max_id < entry.high_water:
+                    # Database was replaced or rows were deleted: start over
+                    entry.frame, entry.high_water = None, 0
+                new_rows = []
+                if max_id > entry.high_water:
+                    new_rows = conn.execute(
+                        f"SELECT {', '.join(BASE_COLUMNS)}, progress_json FROM progress_logs "
+                        "WHERE category=? AND id>? AND id<=? ORDER BY id",
+                        (category, entry.high_water, max_id)
+                    ).fetchall()
+            if new_rows or entry.frame is None:
+                fresh = pd.DataFrame(_flatten(new_rows), columns=None if new_rows else BASE_COLUMNS)
+                frame = fresh if entry.frame is None else pd.concat([entry.frame, fresh], ignore_index=True)
+                for col in CATEGORICAL:
+                    if col in frame.columns:
+                        frame[col] = frame[col].astype("category")
+                entry.frame = frame
+                entry.high_water = max(entry.high_water, max_id)
+                entry.nbytes = int(frame.memory_usage(deep=True).sum())
+            frame = entry.frame
+        self._evict(keep=key)
+        return frame
+
+    def _evict(self, keep):
+        with self._lock:
+            total = sum(e.nbytes for e in self._entries.values())
+            free = _free_memory()
+            low_memory = 0 <= free < MIN_FREE_BYTES
+            for key in list(self._entries):
+                if total <= self.max_bytes and not low_memory:
+                    break
+                if key == keep:
+                    continue
+                total -= self._entries.pop(key).nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                f"{os.path.basename(k[0])}:{k[1]}": {"rows": 0 if e.frame is None else len(e.frame),
+                                                     "high_water": e.high_water, "bytes": e.nbytes}
+                for k, e in self._entries.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = ResultsCache()
+
+
+def get_cache() -> ResultsCache:
+    return _cache
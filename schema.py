@@ -0,0 +1,177 @@
+"""
+Typed columns and indexes for progress_logs.
+
+progress_logs only had the opaque progress_json blob, so the resume and
+duplicate checks ("latest row for this session and category") sorted the
+whole table on every call.  The fields those checks and the results page
+need are promoted to real columns, filled at insert time, and a composite
+index on (session_id, category, id) turns the lookups into index seeks.
+
+resume_state holds each user's position per workflow (last case, slice,
+corrections not yet submitted).  It is upserted in the same transaction as
+every progress insert, so resuming after login is one primary-key read.
+
+Existing databases are brought up to date by migrations.py.
+"""
+import json
+
+# progress dict key -> column type
+PROMOTED_COLUMNS = {
+    "case_id":      "TEXT",
+    "last_case":    "INTEGER",
+    "initial_eval": "TEXT",
+    "final_eval":   "TEXT",
+    "mode":         "TEXT",
+}
+
+INSERT_PROGRESS_SQL = (
+    "INSERT INTO progress_logs(session_id, category, progress_json, "
+    + ", ".join(PROMOTED_COLUMNS)
+    + ") VALUES (?, ?, ?" + ", ?" * len(PROMOTED_COLUMNS) + ")"
+)
+
+
+def promoted_values(progress: dict) -> tuple:
+    """Column values for a progress dict, in PROMOTED_COLUMNS order."""
+    values = []
+    for key, ctype in PROMOTED_COLUMNS.items():
+        v = progress.get(key)
+        if v is not None:
+            v = int(v) if ctype == "INTEGER" else str(v)
+        values.append(v)
+    return tuple(values)
+
+
+def progress_row(session_id: str, category: str, progress: dict) -> tuple:
+    """Parameters for INSERT_PROGRESS_SQL."""
+    return (session_id, category, json.dumps(progress)) + promoted_values(progress)
+
+
+def ensure_progress_schema(conn) -> int:
+    """
+    Add any missing promoted columns (backfilling them from progress_json)
+    and the lookup index.  Returns the number of columns added.
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(progress_logs)")}
+    added = [k for k in PROMOTED_COLUMNS if k not in existing]
+    for key in added:
+        conn.execute(f"ALTER TABLE progress_logs ADD COLUMN {key} {PROMOTED_COLUMNS[key]}")
+    if added:
+        sets = ", ".join(
+            f"{k} = CAST(json_extract(progress_json, '$.{k}') AS {PROMOTED_COLUMNS[k]})"
+            for k in added
+        )
+        conn.execute(f"UPDATE progress_logs SET {sets} WHERE json_valid(progress_json)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_progress_session_category "
+        "ON progress_logs(session_id, category, id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_progress_category "
+        "ON progress_logs(category, id)"
+    )
+    return len(added)
+
+
+# --------------------------------------------------
+# resume_state: one row per (user, category), kept in step with progress_logs
+# --------------------------------------------------
+RESUME_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS resume_state (
+        user TEXT NOT NULL,
+        category TEXT NOT NULL,
+        last_case INTEGER,
+        current_slice INTEGER NOT NULL DEFAULT 0,
+        pending_corrections TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user, category)
+    ) WITHOUT ROWID
+"""
+
+UPSERT_RESUME_SQL = """
+    INSERT INTO resume_state(user, category, last_case, current_slice, pending_corrections, updated_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(user, category) DO UPDATE SET
+        last_case = excluded.last_case,
+        current_slice = excluded.current_slice,
+        pending_corrections = excluded.pending_corrections,
+        updated_at = excluded.updated_at
+"""
+
+
+def open_corrections(progress: dict) -> list:
+    """
+    The record's corrections for cases other than its own.  Legacy and
+    merged rows carry the submitted case's corrections too; those are not
+    pending.  Corrections without a case_id count as the record's own.
+    """
+    corrections = progress.get("corrections")
+    if not isinstance(corrections, list):
+        return []
+    case_id = str(progress.get("case_id"))
+    return [c for c in corrections
+            if isinstance(c, dict) and c.get("case_id") is not None and str(c["case_id"]) != case_id]
+
+
+def resume_row(user: str, category: str, progress: dict, current_slice: int = 0, pending=None) -> tuple:
+    """
+    Parameters for UPSERT_RESUME_SQL.  pending is the list of corrections
+    still open after this write; it defaults to open_corrections(progress).
+    """
+    if pending is None:
+        pending = open_corrections(progress)
+    last_case = progress.get("last_case")
+    return (
+        user, category,
+        int(last_case) if last_case is not None else None,
+        int(current_slice or 0),
+        json.dumps(pending) if pending else None,
+    )
+
+
+def ensure_resume_state(conn):
+    """Create resume_state and seed it from the latest progress row per user/category."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='resume_state'"
+    ).fetchone()
+    if exists:
+        return
+    conn.execute(RESUME_STATE_DDL)
+    cur = conn.execute("""
+        SELECT p.session_id, p.category, p.last_case, p.progress_json
+        FROM progress_logs p
+        JOIN (SELECT MAX(id) AS id FROM progress_logs GROUP BY session_id, category) latest
+          ON latest.id = p.id
+        WHERE p.session_id IS NOT NULL AND p.category IS NOT NULL
+    """)
+    rows = []
+    for session_id, category, last_case, blob in cur.fetchall():
+        try:
+            progress = json.loads(blob) if blob else {}
+        except ValueError:
+            progress = {}
+        if not isinstance(progress, dict):
+            progress = {}
+        rows.append(resume_row(session_id, category, dict(progress, last_case=last_case)))
+    conn.executemany(
+        "INSERT OR IGNORE INTO resume_state(user, category, last_case, current_slice, pending_corrections) "
+        "VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def load_resume_state(conn, user: str) -> dict:
+    """{category: {"last_case", "current_slice", "pending_corrections"}} for user."""
+    state = {}
+    for category, last_case, current_slice, pending in conn.execute(
+        "SELECT category, last_case, current_slice, pending_corrections "
+        "FROM resume_state WHERE user=?",
+        (user,)
+    ):
+        state[category] = {
+            "last_case": last_case or 0,
+            "current_slice": current_slice or 0,
+            "pending_corrections": json.loads(pending) if pending else [],
+        }
+    return state
+
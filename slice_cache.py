@@ -0,0 +1,239 @@
+"""
+Display-resolution derivatives of the CT slices.
+
+The carousel shows slices at DISPLAY_WIDTH pixels, but st.image was handed
+the full 1024x768 JPEGs, so every slice click re-read and shipped ~80 KB
+to the browser.  This module keeps pre-resized copies (JPEG, optionally
+WebP) under .cache/slices/, named by the SHA-1 of the source file, and the
+carousel serves those instead.
+
+    python slice_cache.py [BASE_IMAGE_DIR] [--width 500] [--webp] [--workers N]
+
+builds the whole cache in parallel.  A slice missing from it is served
+from its source file while a background thread renders the derivative and
+saves the index, so the app works without a prebuilt cache and later
+processes find what earlier ones rendered.  Paths handed out are
+remembered for the life of the process; build_cache() clears that memo.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(".cache", "slices")
+INDEX_PATH = os.path.join(CACHE_DIR, "index.json")
+DISPLAY_WIDTH = 500
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+FORMATS = {"jpeg": ".jpg", "webp": ".webp"}
+PREFERRED_FORMATS = ("webp", "jpeg")   # served in this order when present
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def derivative_path(digest: str, width: int, fmt: str) -> str:
+    return os.path.join(CACHE_DIR, digest[:2], f"{digest}-w{width}{FORMATS[fmt]}")
+
+
+def render(src: str, dst: str, width: int, fmt: str):
+    """Resize src to width pixels and write it to dst atomically."""
+    from PIL import Image, ImageChops
+
+    with Image.open(src) as img:
+        img = img.convert("RGB")
+        r, g, b = img.split()
+        # The slices are grey values stored as RGB; one channel is enough
+        if ImageChops.difference(r, g).getbbox() is None and ImageChops.difference(r, b).getbbox() is None:
+            img = r
+        if img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        if fmt == "webp":
+            img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+        else:
+            img.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    os.replace(tmp, dst)
+
+
+def _build_one(job):
+    src, width, formats = job
+    st = os.stat(src)
+    digest = file_digest(src)
+    variants = {}
+    for fmt in formats:
+        dst = derivative_path(digest, width, fmt)
+        if not os.path.exists(dst):
+            render(src, dst, width, fmt)
+        variants[f"{width}.{fmt}"] = dst
+    return src, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": digest, "variants": variants}
+
+
+# --------------------------------------------------
+# Index: source path -> stat, digest and rendered variants
+# --------------------------------------------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def _load_index() -> dict:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    with open(INDEX_PATH, "r", encoding="utf-8") as f:
+                        _index = json.load(f)
+                except (OSError, ValueError):
+                    _index = {}
+    return _index
+
+
+def _save_index(index: dict):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        # Other processes may have rendered slices since this one loaded
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            index = {**json.load(f), **index}
+    except (OSError, ValueError):
+        pass
+    tmp = f"{INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, INDEX_PATH)
+
+
+def _is_current(entry, src: str) -> bool:
+    if not entry:
+        return False
+    try:
+        st = os.stat(src)
+    except OSError:
+        return False
+    return entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+
+
+def build_cache(paths, width: int = DISPLAY_WIDTH, formats=("jpeg",), workers=None) -> int:
+    """Render every out-of-date derivative in a process pool; returns the number rebuilt."""
+    global _index
+    index = dict(_load_index())
+    todo = []
+    for src in paths:
+        entry = index.get(src)
+        if (_is_current(entry, src)
+                and all(os.path.exists(entry["variants"].get(f"{width}.{fmt}", "")) for fmt in formats)):
+            continue
+        todo.append((src, width, tuple(formats)))
+    if todo:
+        from concurrent.futures import ProcessPoolExecutor   # build-time only
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for src, entry in pool.map(_build_one, todo, chunksize=16):
+                old = index.get(src)
+                if old and old["sha1"] == entry["sha1"]:
+                    entry["variants"] = {**old["variants"], **entry["variants"]}
+                index[src] = entry
+        _save_index(index)
+    with _index_lock:
+        _index = index
+        _served.clear()
+    return len(todo)
+
+
+# --------------------------------------------------
+# Serving: memoised lookups, misses rendered in the background
+# --------------------------------------------------
+_served = {}                    # (src, width) -> path handed out
+_pending = set()                # (src, width) queued for rendering
+_renders = queue.Queue()
+_render_thread = None
+
+
+def _render_worker():
+    dirty = False
+    while True:
+        src, width = _renders.get()
+        try:
+            _, entry = _build_one((src, width, ("jpeg",)))
+        except Exception:
+            log.exception("cannot render %s; serving the source", src)
+            entry = None
+        index = _load_index()
+        with _index_lock:
+            _pending.discard((src, width))
+            if entry is None:
+                _served[(src, width)] = src
+            else:
+                old = index.get(src)
+                if old and old["sha1"] == entry["sha1"]:
+                    entry["variants"] = {**old["variants"], **entry["variants"]}
+                index[src] = entry
+                _served[(src, width)] = entry["variants"][f"{width}.jpeg"]
+                dirty = True
+            snapshot = dict(index) if dirty and _renders.empty() else None
+        if snapshot is not None:
+            try:
+                _save_index(snapshot)
+                dirty = False
+            except OSError:
+                log.exception("cannot save %s", INDEX_PATH)
+
+
+def _queue_render(src: str, width: int):
+    global _render_thread
+    with _index_lock:
+        if (src, width) in _pending:
+            return
+        _pending.add((src, width))
+        if _render_thread is None:
+            _render_thread = threading.Thread(target=_render_worker, name="slice-render", daemon=True)
+            _render_thread.start()
+    _renders.put((src, width))
+
+
+def display_path(src: str, width: int = DISPLAY_WIDTH) -> str:
+    """
+    Path of the display-size copy of src.  On a cache miss src itself is
+    returned and the copy is rendered in the background.
+    """
+    served = _served.get((src, width))
+    if served is not None:
+        return served
+    entry = _load_index().get(src)
+    if _is_current(entry, src):
+        for fmt in PREFERRED_FORMATS:
+            dst = entry["variants"].get(f"{width}.{fmt}")
+            if dst and os.path.exists(dst):
+                _served[(src, width)] = dst
+                return dst
+    _queue_render(src, width)
+    return src
+
+
+if __name__ == "__main__":
+    from manifest import build_manifest
+
+    parser = argparse.ArgumentParser(description="Pre-render display-size slice derivatives.")
+    parser.add_argument("base_dir", nargs="?", default="2D_Image_clean")
+    parser.add_argument("--width", type=int, default=DISPLAY_WIDTH)
+    parser.add_argument("--webp", action="store_true", help="also write WebP derivatives")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    m = build_manifest(args.base_dir)
+    paths = [p for case_id in m.case_ids for p in m.slice_paths(case_id)]
+    formats = ("jpeg", "webp") if args.webp else ("jpeg",)
+    n = build_cache(paths, args.width, formats, args.workers)
+    print(f"{len(paths)} slices, {n} rebuilt into {CACHE_DIR}")
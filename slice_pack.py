@@ -0,0 +1,310 @@
+"""
+Packed per-case slice archives.
+
+A case is ~34 JPEGs with 60-character DICOM-UID names, so every carousel
+render stats and opens each slice, and copying the ~2,000-file tree to a
+new annotation server is dominated by per-file overhead.  A pack holds one
+case in one file:
+
+    header   MAGIC, version, entry count, offset and length of the index
+    blobs    file contents, each distinct content stored once
+    index    JSON {"case_id", "entries": {name: [offset, length, sha1]}}
+
+Entry names are "<tree>/<file>" for the source trees packed (2D_Image_clean
+and, with --raw, 2D_Image) plus "<tree>@w<width>/<file>" for the display
+derivatives slice_cache renders.  Identical content is stored once, within
+and across trees.
+
+Packs are read through mmap; SliceArchive.view() returns a memoryview of
+the mapping, so serving a slice is a slice of the page cache rather than
+an open and a read.  (Streamlit's media manager takes bytes, so the copy
+happens there, once per rerun, from memory.)  display_slices() is what the
+carousel calls: the case's derivatives from its pack when there is one,
+loose files through slice_cache otherwise.
+
+    python slice_pack.py pack [CASE ...] [--raw] [--width 500] [--out packs] [--force]
+    python slice_pack.py unpack PACK ... [--out DIR]
+    python slice_pack.py ls PACK
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from slice_cache import DISPLAY_WIDTH, display_path
+
+PACK_DIR = "packs"
+PACK_EXT = ".pack"
+MAGIC = b"CPTAPACK"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQQ")   # magic, version, flags, entries, index offset, index length
+BASE_TREE = "2D_Image_clean"
+RAW_TREE = "2D_Image"
+
+
+def pack_path(case_id: str, pack_dir: str = PACK_DIR) -> str:
+    return os.path.join(pack_dir, case_id + PACK_EXT)
+
+
+def derivative_name(tree: str, width: int, fname: str) -> str:
+    return f"{tree}@w{width}/{fname}"
+
+
+# --------------------------------------------------
+# Reader
+# --------------------------------------------------
+class SliceArchive:
+    """Read-only view of one pack; entries are memoryviews into an mmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.stat = (st.st_mtime_ns, st.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            try:
+                magic, version, _, count, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"{path}: not a version {VERSION} slice pack")
+                index = json.loads(self._map[index_offset:index_offset + index_length])
+                self.case_id = index["case_id"]
+                self.entries = index["entries"]
+            except (struct.error, KeyError, TypeError) as e:
+                raise ValueError(f"{path}: damaged slice pack ({e!r})") from e
+            if len(self.entries) != count:
+                raise ValueError(f"{path}: index holds {len(self.entries)} of {count} entries")
+        except BaseException:
+            self._map.close()
+            raise
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def names(self, prefix: str = "") -> list:
+        return [n for n in self.entries if n.startswith(prefix)]
+
+    def view(self, name: str) -> memoryview:
+        """Zero-copy view of an entry; valid while the archive is referenced."""
+        offset, length, _ = self.entries[name]
+        return memoryview(self._map)[offset:offset + length]
+
+    def read(self, name: str) -> bytes:
+        offset, length, _ = self.entries[name]
+        return self._map[offset:offset + length]
+
+
+_archives = {}         # path -> SliceArchive, or None when there is no pack
+_archives_lock = threading.Lock()
+
+
+def open_archive(path: str):
+    """
+    Shared SliceArchive for path, or None if there is none.  One stat per
+    call revalidates it; a repacked file is mapped afresh, and views of the
+    old mapping stay valid until they are dropped.
+    """
+    try:
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stat = None
+    archive = _archives.get(path)
+    if archive is not None and archive.stat == stat:
+        return archive
+    if stat is None:
+        return None
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None or archive.stat != stat:
+            try:
+                archive = SliceArchive(path)
+            except (OSError, ValueError):
+                archive = None
+            _archives[path] = archive
+    return archive
+
+
+def display_slices(case_id: str, paths: list, width: int = DISPLAY_WIDTH, pack_dir: str = PACK_DIR) -> list:
+    """
+    What the carousel hands slice_viewer for a case: (name, memoryview)
+    pairs from the case's pack when it has every derivative and is newer
+    than the slices, otherwise the display-size paths from slice_cache.
+    """
+    archive = open_archive(pack_path(case_id, pack_dir)) if paths else None
+    if archive is not None and _newest_mtime(paths) > archive.stat[0]:
+        archive = None      # the case was rebuilt after it was packed
+    if archive is not None:
+        tree = os.path.basename(os.path.dirname(os.path.dirname(paths[0])))
+        names = [derivative_name(tree, width, os.path.basename(p)) for p in paths]
+        if all(n in archive for n in names):
+            return [(n, archive.view(n)) for n in names]
+    return [display_path(p, width) for p in paths]
+
+
+def _newest_mtime(paths) -> int:
+    newest = 0
+    for p in paths:
+        try:
+            newest = max(newest, os.stat(p).st_mtime_ns)
+        except OSError:
+            pass
+    return newest
+
+
+# --------------------------------------------------
+# Writer
+# --------------------------------------------------
+def write_pack(out_path: str, case_id: str, files: dict) -> dict:
+    """
+    Pack {entry name: source path} into out_path atomically; content seen
+    before is stored once.  Returns entry, blob and byte counts.
+    """
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    entries, blobs = {}, {}
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for name in sorted(files):
+            with open(files[name], "rb") as src:
+                data = src.read()
+            digest = hashlib.sha1(data).hexdigest()
+            if digest not in blobs:
+                blobs[digest] = (f.tell(), len(data))
+                f.write(data)
+            offset, length = blobs[digest]
+            entries[name] = [offset, length, digest]
+        index_offset = f.tell()
+        index = json.dumps({"case_id": case_id, "created": time.time(), "entries": entries},
+                           separators=(",", ":")).encode("utf-8")
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(entries), index_offset, len(index)))
+    os.replace(tmp, out_path)
+    return {"entries": len(entries), "blobs": len(blobs), "bytes": os.path.getsize(out_path)}
+
+
+def case_files(case_id: str, trees, width: int = None) -> dict:
+    """Entry name -> path for a case's slices and reports in each tree."""
+    from manifest import REPORT_FILES, load_manifest
+
+    files = {}
+    for i, base_dir in enumerate(trees):
+        tree = os.path.basename(os.path.normpath(base_dir))
+        m = load_manifest(base_dir)
+        slices = m.slice_paths(case_id)
+        for p in slices:
+            files[f"{tree}/{os.path.basename(p)}"] = p
+        for name in REPORT_FILES:
+            if m.report_info(case_id, name):
+                files[f"{tree}/{name}"] = m.report_path(case_id, name)
+        # Derivatives only for the tree the apps display
+        if width and i == 0:
+            for p in slices:
+                dst = display_path(p, width)
+                if dst != p:
+                    files[derivative_name(tree, width, os.path.basename(p))] = dst
+    return files
+
+
+def pack_case(case_id: str, trees=(BASE_TREE,), width: int = DISPLAY_WIDTH,
+              pack_dir: str = PACK_DIR, force: bool = False):
+    """Pack one case unless its pack is newer than every input; None when skipped."""
+    files = case_files(case_id, trees, width)
+    out = pack_path(case_id, pack_dir)
+    if not force and os.path.exists(out):
+        archive = open_archive(out)
+        newest = _newest_mtime(files.values())
+        if archive is not None and set(archive.entries) == set(files) and newest <= archive.stat[0]:
+            return None
+    return write_pack(out, case_id, files)
+
+
+def _entry_path(out_root: str, case_id: str, name: str) -> str:
+    """<out_root>/<tree>/<case>/<file> for an entry; ValueError if it would leave out_root."""
+    parts = [case_id] + name.split("/")
+    if len(parts) < 3 or any(not p or p in (".", "..") or "/" in p or "\\" in p or os.path.isabs(p) for p in parts):
+        raise ValueError(f"unsafe entry {name!r} for case {case_id!r}")
+    tree, rest = parts[1], parts[2:]
+    root = os.path.realpath(out_root)
+    dst = os.path.realpath(os.path.join(root, tree, case_id, *rest))
+    if os.path.commonpath([dst, root]) != root:
+        raise ValueError(f"entry {name!r} would be written outside {out_root}")
+    return dst
+
+
+def unpack(path: str, out_root: str = ".", derivatives: bool = False) -> int:
+    """
+    Write a pack's entries back to <out_root>/<tree>/<case>/<file>; returns
+    files written.  Packs come from other servers, so every entry path is
+    checked before anything is written.
+    """
+    archive = SliceArchive(path)
+    targets = []
+    for name in archive.names():
+        if "@" in name.split("/", 1)[0] and not derivatives:
+            continue
+        targets.append((name, _entry_path(out_root, archive.case_id, name)))
+    count = 0
+    for name, dst in targets:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(archive.view(name))
+        os.replace(tmp, dst)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Pack, unpack and list per-case slice archives.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    pk = sub.add_parser("pack", help="pack cases (default: every case in 2D_Image_clean)")
+    pk.add_argument("cases", nargs="*")
+    pk.add_argument("--raw", action="store_true", help=f"also pack {RAW_TREE}")
+    pk.add_argument("--width", type=int, default=DISPLAY_WIDTH, help="display derivatives (0 = none)")
+    pk.add_argument("--out", default=PACK_DIR)
+    pk.add_argument("--force", action="store_true")
+    up = sub.add_parser("unpack", help="restore loose files")
+    up.add_argument("packs", nargs="+")
+    up.add_argument("--out", default=".")
+    up.add_argument("--derivatives", action="store_true", help="also write the display derivatives")
+    ls = sub.add_parser("ls", help="list a pack's entries")
+    ls.add_argument("pack")
+    args = p.parse_args()
+
+    if args.cmd == "pack":
+        from manifest import load_manifest
+        from slice_cache import build_cache
+
+        trees = (BASE_TREE, RAW_TREE) if args.raw else (BASE_TREE,)
+        m = load_manifest(BASE_TREE)
+        cases = args.cases or m.case_ids
+        if args.width:
+            # Render missing derivatives in parallel before packing
+            build_cache([p for c in cases for p in m.slice_paths(c)], args.width)
+        totals = {"packed": 0, "skipped": 0, "entries": 0, "blobs": 0, "bytes": 0}
+        for case_id in cases:
+            r = pack_case(case_id, trees, args.width, args.out, args.force)
+            if r is None:
+                totals["skipped"] += 1
+                continue
+            totals["packed"] += 1
+            for k in ("entries", "blobs", "bytes"):
+                totals[k] += r[k]
+        print(f"{totals['packed']} packed, {totals['skipped']} up to date; {totals['entries']} entries "
+              f"in {totals['blobs']} blobs, {totals['bytes'] / 1e6:.1f} MB in {args.out}/")
+    elif args.cmd == "unpack":
+        for path in args.packs:
+            try:
+                print(f"{path}: {unpack(path, args.out, args.derivatives)} files")
+            except ValueError as e:
+                raise SystemExit(f"slice_pack: {e}")
+    else:
+        archive = SliceArchive(args.pack)
+        for name, (offset, length, digest) in archive.entries.items():
+            print(f"{offset:>10} {length:>8}  {digest[:12]}  {name}")
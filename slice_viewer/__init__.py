@@ -0,0 +1,92 @@
+"""
+Client-side slice stack viewer.
+
+The old carousel re-ran the whole script (auth, DB setup, case discovery,
+report loading) for every Prev/Next click.  This component hands the
+browser the URLs of all slices of a case once; scrolling with the mouse
+wheel, arrow keys or the slider happens locally with neighbouring slices
+prefetched, and only the slice the reader settles on is reported back.
+
+Slices are registered with Streamlit's media file manager, whose URLs are
+derived from the file content, so reruns reuse what the browser already has
+instead of shipping the images again.  A slice is either a path or a
+(name, data) pair, as slice_pack serves them from a case's archive.
+
+Streamlit drops a session's media references at every rerun, so the slices
+have to be added again each time.  File contents are kept in a
+process-wide cache keyed on path, size and mtime (up to CACHE_BYTES), so a
+rerun costs a stat per slice rather than reading the whole stack again.
+"""
+import base64
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+_component = components.declare_component("slice_viewer", path=_FRONTEND_DIR)
+
+CACHE_BYTES = 64 << 20
+
+_blobs = OrderedDict()      # path -> (size, mtime_ns, bytes), least recently used first
+_blobs_size = 0
+_blobs_lock = threading.Lock()
+
+
+def _read(path: str) -> bytes:
+    """A slice file's bytes, read from disk only when it is new or changed."""
+    global _blobs_size
+    st = os.stat(path)
+    with _blobs_lock:
+        hit = _blobs.get(path)
+        if hit is not None and hit[:2] == (st.st_size, st.st_mtime_ns):
+            _blobs.move_to_end(path)
+            return hit[2]
+    with open(path, "rb") as f:
+        data = f.read()
+    with _blobs_lock:
+        old = _blobs.pop(path, None)
+        if old is not None:
+            _blobs_size -= len(old[2])
+        _blobs[path] = (st.st_size, st.st_mtime_ns, data)
+        _blobs_size += len(data)
+        while _blobs_size > CACHE_BYTES and len(_blobs) > 1:
+            _blobs_size -= len(_blobs.popitem(last=False)[1][2])
+    return data
+
+
+def _data_uri(source: bytes, mimetype: str) -> str:
+    return f"data:{mimetype};base64,{base64.b64encode(source).decode('ascii')}"
+
+
+def _image_url(image, coordinates: str) -> str:
+    if isinstance(image, str):
+        name, source = image, _read(image)
+    else:
+        name, data = image
+        source = bytes(data)      # the media manager stores bytes
+    mimetype = mimetypes.guess_type(name)[0] or "image/jpeg"
+    try:
+        from streamlit import runtime
+        return runtime.get_instance().media_file_mgr.add(source, mimetype, coordinates)
+    except Exception:
+        # No server runtime (bare script) or an older media manager API
+        return _data_uri(source, mimetype)
+
+
+def slice_viewer(images, index: int = 0, width: int = 500, key: str = None) -> int:
+    """
+    Render the slice stack and return the slice index the reader settled on.
+
+    images  -- slice image paths or (name, data) pairs, in display order
+    index   -- slice shown when the viewer is first drawn
+    key     -- widget key; use one per case so a new case starts fresh
+    """
+    urls = [_image_url(p, f"slice_viewer.{key}.{i}") for i, p in enumerate(images)]
+    value = _component(images=urls, index=index, width=width, key=key, default=index)
+    try:
+        return max(0, min(int(value), len(images) - 1))
+    except (TypeError, ValueError):
+        return index
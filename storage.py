@@ -0,0 +1,103 @@
+"""
+Progress and annotation persistence shared by both apps.
+
+These functions take everything they need as arguments (no st.session_state),
+so they can run on the write-behind worker thread, in tools, and in tests.
+Progress is written as the per-case delta (progress_delta); resume_state
+is computed from the full record first.
+"""
+import csv
+import os
+import threading
+
+import db
+from annotation_store import get_store
+from journal import get_journal
+from progress_delta import CSV_COLUMNS, to_delta
+from schema import INSERT_PROGRESS_SQL, UPSERT_RESUME_SQL, progress_row, resume_row
+
+_csv_headers = {}       # path -> header of a CSV this process appends to
+_csv_lock = threading.Lock()
+
+
+def should_log(conn, session_id: str, category: str, new_progress: dict) -> bool:
+    """
+    Skip logging if the latest saved entry for this session/category
+    has the same last_case (for evals) or same case_id (for AI-edit).
+    """
+    row = conn.execute(
+        "SELECT last_case, case_id FROM progress_logs "
+        "WHERE session_id=? AND category=? "
+        "ORDER BY id DESC LIMIT 1",
+        (session_id, category)
+    ).fetchone()
+    if not row:
+        return True
+    last_case, last_case_id = row
+    if "last_case" in new_progress:
+        return last_case != new_progress.get("last_case")
+    if category == "ai_edit" and "case_id" in new_progress:
+        return last_case_id != str(new_progress.get("case_id"))
+    return True
+
+
+def _csv_header(cpath: str, columns: list) -> list:
+    """
+    Header to append under.  A file written before deltas (different
+    columns) is moved aside to *.legacy.csv and a new one started.
+    """
+    with _csv_lock:
+        header = _csv_headers.get(cpath)
+        if header is None and os.path.exists(cpath):
+            with open(cpath, "r", newline="", encoding="utf-8") as f:
+                header = next(csv.reader(f), [])
+            if header[:1] != ["v"]:
+                os.replace(cpath, cpath[:-len(".csv")] + ".legacy.csv")
+                header = None
+        if header is None:
+            header = columns
+        _csv_headers[cpath] = header
+        return header
+
+
+def append_progress_files(log_dir: str, session_id: str, category: str, progress: dict):
+    """Per-session JSONL journal and CSV copies of a progress record."""
+    import pandas as pd
+
+    get_journal(os.path.join(log_dir, f"{category}_{session_id}_progress.jsonl")).append(progress)
+    cpath = os.path.join(log_dir, f"{category}_{session_id}_progress.csv")
+    header = _csv_header(cpath, CSV_COLUMNS.get(category) or list(progress))
+    df = pd.DataFrame([progress]).reindex(columns=header)
+    if os.path.exists(cpath):
+        df.to_csv(cpath, index=False, mode="a", header=False)
+    else:
+        df.to_csv(cpath, index=False)
+
+
+def apply_progress(conn, log_dir: str, session_id: str, category: str, progress: dict,
+                   current_slice: int = 0, pending=None) -> bool:
+    """
+    Write one progress record inside the caller's transaction: files, the
+    progress_logs row and the resume_state upsert.  Returns False if it was
+    a duplicate of the latest entry and nothing was written.
+    """
+    if not should_log(conn, session_id, category, progress):
+        return False
+    resume = resume_row(session_id, category, progress, current_slice, pending)
+    delta = to_delta(progress)
+    append_progress_files(log_dir, session_id, category, delta)
+    conn.execute(INSERT_PROGRESS_SQL, progress_row(session_id, category, delta))
+    conn.execute(UPSERT_RESUME_SQL, resume)
+    return True
+
+
+def write_progress(db_path: str, log_dir: str, session_id: str, category: str, progress: dict,
+                   current_slice: int = 0, pending=None) -> bool:
+    with db.transaction(db_path) as conn:
+        return apply_progress(conn, log_dir, session_id, category, progress, current_slice, pending)
+
+
+def write_annotations(store_dir: str, case_id: str, annotations: list, op_id: str = None) -> bool:
+    # One atomic append; {store_dir}/{case_id}_annotations.json is an export
+    # (python annotation_store.py export).  op_id makes a replayed write a no-op
+    return get_store(store_dir).append(case_id, annotations, op_id)
@@ -0,0 +1,310 @@
+"""
+Write-behind queue for progress and annotation saves.
+
+"Submit & Next" used to block on a journal append, a pandas CSV append and a
+SQLite commit before st.rerun() could fire.  Saves are now handed to a
+bounded in-process queue and written by one worker thread, which drains up
+to BATCH_MAX operations at a time and commits all progress rows for a
+database in a single transaction.
+
+Durability: each operation is appended to a spool journal and fsynced
+before submit() returns, and the worker records the last sequence number
+it applied in a checkpoint file.  Operations still in the spool after a
+crash are replayed by the worker as soon as get_queue() hands the queue
+out again, so before any resume read; at exit the queue is flushed.  Each
+server process should use its own spool file.
+
+Replay is idempotent: progress rows are deduplicated by should_log, and
+annotation writes carry an op id (the spool's id and seq) that the
+annotation store will not append twice.  Operations the backend rejects
+are moved to a dead-letter journal next to the spool (*.failed.jsonl)
+rather than dropped; `python write_queue.py retry SPOOL` applies them
+again.  If even that fails, the checkpoint stops short of the batch so
+a restart replays it.
+
+Batches are applied through a storage backend (backend.py): local SQLite by
+default, or a shared store server.  While the store server is unreachable
+the worker holds on to the batch and retries; saves queue up behind it.
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from backend import SQLiteBackend
+from journal import Journal, read_journal
+from progress_delta import to_delta
+
+log = logging.getLogger(__name__)
+
+MAX_PENDING = 1000          # submit() blocks beyond this many queued writes
+BATCH_MAX = 64
+SPOOL_COMPACT_BYTES = 1 << 20
+FLUSH_TIMEOUT = 30.0        # seconds to wait for the backlog at exit
+RETRY_PAUSE = 5.0           # seconds between attempts while the store is unreachable
+
+
+class WriteQueue:
+
+    def __init__(self, spool_path: str, maxsize: int = MAX_PENDING, backend=None):
+        self.spool_path = spool_path
+        self.backend = backend or SQLiteBackend()
+        self.checkpoint_path = spool_path + ".done"
+        self.failed_path = failed_path(spool_path)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._spool = Journal(spool_path, fsync_every=1)
+        self._failed = Journal(self.failed_path, fsync_every=1)
+        self._lock = threading.Lock()     # orders spool appends with queue puts
+        self._seq = 0
+        self._done = 0                    # last seq the worker has finished with
+        self._done_cond = threading.Condition()
+        self._last = {}                   # session id -> seq of its latest write
+        self._hold = None                 # checkpoint ceiling while a batch is unaccounted for
+        self._id = None
+        self._thread = None
+
+    # -------- lifecycle --------
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _spool_id(self) -> str:
+        """Stable id of this spool, so op ids survive restarts."""
+        path = self.spool_path + ".id"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spool_id = f.read().strip()
+        except OSError:
+            spool_id = ""
+        if not spool_id:
+            spool_id = uuid.uuid4().hex
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(spool_id)
+            os.replace(tmp, path)
+        return spool_id
+
+    def _write_checkpoint(self, seq: int):
+        if self._hold is not None:
+            seq = min(seq, self._hold)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(seq))
+        os.replace(tmp, self.checkpoint_path)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._id = self._spool_id()
+            done = self._read_checkpoint()
+            leftover = [op for op in read_journal(self.spool_path) if op.get("seq", 0) > done]
+            self._seq = max([done] + [op["seq"] for op in leftover])
+            self._done = done
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush, FLUSH_TIMEOUT)
+            if leftover:
+                # Replayed by the worker like fresh submits, so flush() and
+                # the retry and dead-letter handling cover them too
+                log.warning("replaying %d unsaved writes from %s", len(leftover), self.spool_path)
+                for op in leftover:
+                    if op.get("session_id") is not None:
+                        self._last[op["session_id"]] = op["seq"]
+                    self._queue.put(op)
+
+    def submit(self, kind: str, **payload) -> int:
+        """
+        Queue one write; the payload is snapshotted, so callers may keep
+        mutating it.  Returns its sequence number.
+        """
+        self.start()
+        with self._lock:
+            self._seq += 1
+            op = {"seq": self._seq, "op_id": f"{self._id}:{self._seq}", "kind": kind, **payload}
+            self._spool.append(op)
+            if payload.get("session_id") is not None:
+                self._last[payload["session_id"]] = self._seq
+            # Round-trip through JSON so session-state objects are not shared
+            self._queue.put(json.loads(json.dumps(op, default=str)))
+            return self._seq
+
+    def backlog(self) -> int:
+        """Writes queued or being applied right now."""
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout: float = None, session_id: str = None) -> bool:
+        """
+        Wait until every queued write is applied, or with session_id only
+        that session's writes; False on timeout.
+        """
+        if session_id is not None:
+            with self._lock:
+                seq = self._last.get(session_id, 0)
+            return self.wait_for(seq, timeout)
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: self._queue.unfinished_tasks == 0, timeout
+            )
+
+    def wait_for(self, seq: int, timeout: float = None) -> bool:
+        """Wait until the worker is done with write `seq` and everything before it."""
+        with self._done_cond:
+            return self._done_cond.wait_for(lambda: self._done >= seq, timeout)
+
+    # -------- worker --------
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                while True:
+                    try:
+                        failed = self._apply(batch)
+                        break
+                    except (ConnectionError, TimeoutError):
+                        log.exception("store unreachable, retrying in %.0fs", RETRY_PAUSE)
+                        time.sleep(RETRY_PAUSE)
+                    except Exception as e:
+                        log.exception("write-behind batch failed")
+                        failed = [dict(op, error=f"{type(e).__name__}: {e}") for op in batch]
+                        break
+                self._dead_letter(failed)
+                self._write_checkpoint(batch[-1]["seq"])
+                self._compact()
+            except Exception:
+                # Not even dead-lettered: keep the checkpoint below this batch
+                # so the next start replays it
+                log.exception("write-behind batch %d-%d not recorded", batch[0]["seq"], batch[-1]["seq"])
+                ceiling = batch[0]["seq"] - 1
+                self._hold = ceiling if self._hold is None else min(self._hold, ceiling)
+            finally:
+                with self._done_cond:
+                    self._done = batch[-1]["seq"]
+                    self._done_cond.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _apply(self, ops) -> list:
+        return self.backend.apply(ops)
+
+    def _dead_letter(self, failed: list):
+        for op in failed:
+            log.error("write %s failed (%s); kept in %s", op.get("seq"), op.get("error"), self.failed_path)
+            self._failed.append(op)
+
+    def _compact(self):
+        """Empty the spool once everything in it has been applied."""
+        if self._hold is not None or os.path.getsize(self.spool_path) < SPOOL_COMPACT_BYTES:
+            return
+        # A submitter may hold the lock while blocked on a full queue; the
+        # spool is not empty then anyway, so don't wait for it
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._queue.qsize() == 0:
+                self._spool.close()
+                open(self.spool_path, "w").close()
+        finally:
+            self._lock.release()
+
+
+def failed_path(spool_path: str) -> str:
+    root, ext = os.path.splitext(spool_path)
+    return f"{root}.failed{ext or '.jsonl'}"
+
+
+def retry_failed(spool_path: str, backend=None) -> tuple:
+    """
+    Apply a spool's dead letters again; the ones that still fail stay in the
+    file.  Run it while the app that owns the spool is stopped.  Returns
+    (applied, still failing).
+    """
+    path = failed_path(spool_path)
+    ops = [{k: v for k, v in op.items() if k != "error"} for op in read_journal(path)]
+    if not ops:
+        return 0, 0
+    backend = backend or SQLiteBackend()
+    still = []
+    for i in range(0, len(ops), BATCH_MAX):
+        still += backend.apply(ops[i:i + BATCH_MAX])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for op in still:
+            f.write(json.dumps(op, separators=(",", ":"), default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(ops) - len(still), len(still)
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def spool_path(log_dir: str, name: str) -> str:
+    """Spool file for an app; replicas sharing log_dir set CPTA_REPLICA to keep theirs apart."""
+    replica = os.environ.get("CPTA_REPLICA")
+    return os.path.join(log_dir, f"write_queue_{name}_{replica}.jsonl" if replica
+                        else f"write_queue_{name}.jsonl")
+
+
+def get_queue(spool_path: str, backend=None) -> WriteQueue:
+    """The process's queue for spool_path, started so a crashed run's spool is replayed."""
+    key = os.path.abspath(spool_path)
+    with _queues_lock:
+        wq = _queues.get(key)
+        if wq is None:
+            wq = _queues[key] = WriteQueue(key, backend=backend)
+    wq.start()
+    return wq
+
+
+def submit_progress(wq: WriteQueue, db_path, log_dir, session_id, category, progress,
+                    current_slice=0, pending=None):
+    # Spool the delta, not the full record; pending keeps what resume_state needs
+    if pending is None:
+        pending = progress.get("corrections")
+    wq.submit("progress", db_path=db_path, log_dir=log_dir, session_id=session_id,
+              category=category, progress=to_delta(progress), current_slice=current_slice, pending=pending)
+
+
+def submit_annotations(wq: WriteQueue, store_dir, case_id, annotations):
+    wq.submit("annotations", store_dir=store_dir, case_id=case_id, annotations=annotations)
+
+
+def flush_all(timeout: float = None) -> bool:
+    """Flush every queue in the process (tools and benchmarks)."""
+    with _queues_lock:
+        queues = list(_queues.values())
+    return all([wq.flush(timeout) for wq in queues])
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Write-behind queue maintenance.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    rt = sub.add_parser("retry", help="apply a spool's dead-lettered writes again")
+    rt.add_argument("spool", help="spool file, e.g. logs/write_queue_app1.jsonl")
+    rt.add_argument("--config", default="config.yaml", help="storage: section picks the backend")
+    args = p.parse_args()
+
+    import yaml
+
+    from backend import get_backend
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    applied, still = retry_failed(args.spool, get_backend(config))
+    print(f"{failed_path(args.spool)}: {applied} applied, {still} still failing")